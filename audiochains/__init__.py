@@ -1 +1 @@
-__all__ = ['chains', 'streams', 'writers', 'block_methods', 'exceptions', 'output_types']
+__all__ = ['chains', 'streams', 'writers', 'block_methods', 'exceptions', 'output_types', 'buffers', 'engines', 'readers', 'profiling', 'benchmarks']
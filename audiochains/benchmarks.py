@@ -0,0 +1,257 @@
+"""
+    Benchmarks of block methods and chains on synthetic and recorded audio
+    across the allowed sample rates and a range of block sizes.
+
+    Usage:
+        python -m audiochains.benchmarks --output results.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from importlib import metadata
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from audiochains import block_methods as bm
+from audiochains.chains import ChainOfMethods, GraphOfMethods
+from audiochains.readers import MappedWAV
+from audiochains.schemas import stream_parameters_schema
+
+SAMPLE_RATES = tuple(stream_parameters_schema['properties']['samplerate']['enum'])
+BLOCK_SIZES = (256, 512, 1024, 2048, 4096)
+PLAYBACK_FILE = Path(__file__).parent / 'test' / 'test_playback.wav'
+
+
+def _unpacked(blocks: List[bytes]) -> List[np.ndarray]:
+    return [bm.UnpackRawInFloat32()(block) for block in blocks]
+
+
+def _int24(blocks: List[bytes]) -> List[bytes]:
+    return [bm.PackFloat32InRaw(sampwidth=3)(samples) for samples in _unpacked(blocks)]
+
+
+def _rms(blocks: List[bytes]) -> List[int]:
+    return [bm.RMSFromBytes()(block) for block in blocks]
+
+
+def _db(blocks: List[bytes]) -> List[float]:
+    return [bm.DBLog10()(value) for value in _rms(blocks)]
+
+
+def _shared_unpack_graph(samplerate: int) -> GraphOfMethods:
+    unpack, window = bm.UnpackRawInFloat32(), bm.HammingWindow()
+    return GraphOfMethods({
+        'db': (unpack, bm.RMSFromArray(), bm.DBLog10()),
+        'spectrum': (unpack, window, bm.FourierTransform(framerate=samplerate)),
+        'mfcc': (unpack, bm.StreamingMFCC(samplerate=samplerate, n_mfcc=13)),
+    })
+
+
+def _frame_db(blocks: List[bytes], frame_length: int = 64) -> List[np.ndarray]:
+    """
+    RMS of short frames inside each block in dB, as the input of frame-level classification
+    """
+    return [bm.DBLog10(decimals=None)(np.sqrt((frames * frames).mean(axis=1)) * 2 ** 15)
+            for frames in (samples[:len(samples) // frame_length * frame_length].reshape(-1, frame_length)
+                           for samples in _unpacked(blocks))]
+
+
+# Each case is (factory of the measured method or chain, preparation of its input from raw blocks)
+CASES: Dict[str, Tuple[Callable[[int, int], Callable], Callable[[List[bytes]], list]]] = {
+    'UnpackRawInInt16': (lambda sr, bs: bm.UnpackRawInInt16(), list),
+    'UnpackRawInFloat32': (lambda sr, bs: bm.UnpackRawInFloat32(), list),
+    'UnpackRawInFloat32[int24]': (lambda sr, bs: bm.UnpackRawInFloat32(sampwidth=3), _int24),
+    'PackFloat32InRaw[int24]': (lambda sr, bs: bm.PackFloat32InRaw(sampwidth=3), _unpacked),
+    'UnpackRawSamples': (lambda sr, bs: bm.UnpackRawSamples(), list),
+    'UnpackRawSamples[int24]': (lambda sr, bs: bm.UnpackRawSamples(sampwidth=3), _int24),
+    'RMSFromBytes': (lambda sr, bs: bm.RMSFromBytes(), list),
+    'RMSFromArray': (lambda sr, bs: bm.RMSFromArray(), _unpacked),
+    'DBLog10': (lambda sr, bs: bm.DBLog10(), _rms),
+    'RunningRMS[1s,10s,60s]': (lambda sr, bs: bm.RunningRMS(windows=(1, 10, 60), block_duration=bs / sr), _unpacked),
+    'RunningPeak[1s,10s,60s]': (lambda sr, bs: bm.RunningPeak(windows=(1, 10, 60), block_duration=bs / sr),
+                                _unpacked),
+    'ExponentialRMS[1s,10s,60s]': (lambda sr, bs: bm.ExponentialRMS(time_constants=(1, 10, 60),
+                                                                    block_duration=bs / sr), _unpacked),
+    'ExponentialPeak': (lambda sr, bs: bm.ExponentialPeak(release=1.0, block_duration=bs / sr), _unpacked),
+    'HammingWindow': (lambda sr, bs: bm.HammingWindow(), _unpacked),
+    'FourierTransform': (lambda sr, bs: bm.FourierTransform(framerate=sr), _unpacked),
+    'HammingSpectrum': (lambda sr, bs: bm.HammingSpectrum(framerate=sr, blocksize=bs), _unpacked),
+    'MFCC': (lambda sr, bs: bm.MFCC(n_mfcc=13, freq_rate=sr), _unpacked),
+    'StreamingMFCC': (lambda sr, bs: bm.StreamingMFCC(samplerate=sr, n_mfcc=13), _unpacked),
+    'BandPassFilter': (lambda sr, bs: bm.BandPassFilter(sample_rate=sr), _unpacked),
+    'BandPassFilter[streaming]': (lambda sr, bs: bm.BandPassFilter(sample_rate=sr, streaming=True), _unpacked),
+    'StreamingResample': (lambda sr, bs: bm.StreamingResample(in_rate=sr, out_rate=16000), _unpacked),
+    'SoundPressureThreshold': (lambda sr, bs: bm.SoundPressureThreshold(10.0, 30.0, 50.0), _db),
+    'SoundPressureThreshold[frames]': (lambda sr, bs: bm.SoundPressureThreshold(10.0, 30.0, 50.0), _frame_db),
+    'DBLog10[frames,floor]': (lambda sr, bs: bm.DBLog10(floor=-100.0, decimals=None), _frame_db),
+    'VoiceActivityDetector': (lambda sr, bs: bm.VoiceActivityDetector(samplerate=sr), _unpacked),
+    'ZeroCrossingRate': (lambda sr, bs: bm.ZeroCrossingRate(frame_rate=sr), _unpacked),
+    'YIN': (lambda sr, bs: bm.YIN(frame_rate=sr), _unpacked),
+    'StreamingYIN': (lambda sr, bs: bm.StreamingYIN(frame_rate=sr, frame_length=1024 if sr <= 16000 else 2048),
+                     _unpacked),
+    'PraatPitch': (lambda sr, bs: bm.PraatPitch(frame_rate=sr), _unpacked),
+    'PraatPitch[window]': (lambda sr, bs: bm.PraatPitch(frame_rate=sr, analysis_window=0.5), _unpacked),
+    'chain:rms_db_threshold': (lambda sr, bs: ChainOfMethods(
+        bm.RMSFromBytes(),
+        bm.DBLog10(),
+        bm.SoundPressureThreshold(10.0, 30.0, 50.0)
+    ), list),
+    'chain:meter': (lambda sr, bs: ChainOfMethods(
+        bm.UnpackRawInInt16(),
+        bm.RunningRMS(windows=(1, 10, 60), block_duration=bs / sr),
+        bm.DBLog10(),
+        bm.SoundPressureThreshold(10.0, 30.0, 50.0)
+    ), list),
+    'chain:spectrum': (lambda sr, bs: ChainOfMethods(
+        bm.UnpackRawInFloat32(),
+        bm.HammingWindow(),
+        bm.FourierTransform(framerate=sr)
+    ), list),
+    'chain:filtered_rms': (lambda sr, bs: ChainOfMethods(
+        bm.UnpackRawInFloat32(),
+        bm.BandPassFilter(sample_rate=sr, streaming=True, out_type=np.float32),
+        bm.RMSFromArray()
+    ), list),
+    'chain:resampled_mfcc': (lambda sr, bs: ChainOfMethods(
+        bm.UnpackRawInFloat32(),
+        bm.StreamingResample(in_rate=sr, out_rate=16000),
+        bm.StreamingMFCC(samplerate=16000, n_mfcc=13)
+    ), list),
+    'chain:vad_gated_mfcc': (lambda sr, bs: ChainOfMethods(
+        bm.UnpackRawInFloat32(),
+        bm.VoiceActivityDetector(samplerate=sr),
+        bm.StreamingMFCC(samplerate=sr, n_mfcc=13)
+    ), list),
+    'graph:rms_spectrum': (lambda sr, bs: _shared_unpack_graph(sr), list),
+}
+
+
+def synthetic_signal(samplerate: int, seconds: float = 2.0, seed: int = 0) -> bytes:
+    """
+    A harmonic tone with noise packed as int16 mono audio
+    """
+    t = np.arange(int(samplerate * seconds)) / samplerate
+    tone = np.sin(2 * np.pi * 220 * t) + 0.5 * np.sin(2 * np.pi * 440 * t)
+    noise = np.random.default_rng(seed).normal(0, 0.05, len(t))
+    return (np.clip(tone * 0.4 + noise, -1, 1) * 2 ** 14).astype(np.int16).tobytes()
+
+
+def playback_signal() -> Tuple[bytes, int]:
+    with MappedWAV(str(PLAYBACK_FILE)) as mapped_file:
+        return mapped_file.samples[:, 0].astype(np.int16).tobytes(), mapped_file.framerate
+
+
+def split_blocks(signal: bytes, blocksize: int, sampwidth: int = 2) -> List[bytes]:
+    block_bytes = blocksize * sampwidth
+    return [signal[start:start + block_bytes] for start in range(0, len(signal) - block_bytes + 1, block_bytes)]
+
+
+def measure(method: Callable, inputs: list, blocksize: int, samplerate: int, repeats: int = 3) -> dict:
+    """
+    Runs the method over all inputs and returns the best time of several repeats
+    as a real-time factor (audio duration / processing time) and the mean amount
+    of memory allocated per block at peak.
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for in_data in inputs:
+            method(in_data)
+        best = min(best, time.perf_counter() - start)
+
+    peaks = list()
+    tracemalloc.start()
+    for in_data in inputs:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        method(in_data)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    audio_seconds = len(inputs) * blocksize / samplerate
+    return {
+        'blocks': len(inputs),
+        'seconds_per_block': best / len(inputs),
+        'real_time_factor': audio_seconds / best if best > 0 else float('inf'),
+        'allocated_bytes_per_block': float(np.mean(peaks)),
+    }
+
+
+def _package_version() -> Optional[str]:
+    try:
+        return metadata.version('audiochains')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def run_benchmarks(cases: Optional[Iterable[str]] = None,
+                   samplerates: Iterable[int] = SAMPLE_RATES,
+                   blocksizes: Iterable[int] = BLOCK_SIZES,
+                   seconds: float = 2.0,
+                   repeats: int = 3,
+                   use_playback: bool = True) -> dict:
+    cases = list(cases or CASES)
+    signals = [('synthetic', samplerate, synthetic_signal(samplerate, seconds)) for samplerate in samplerates]
+    if use_playback:
+        signal, samplerate = playback_signal()
+        signals.append(('test_playback.wav', samplerate, signal))
+
+    results = list()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for source, samplerate, signal in signals:
+            for blocksize in blocksizes:
+                blocks = split_blocks(signal, blocksize)
+                if not blocks:
+                    continue
+                for name in cases:
+                    factory, prepare = CASES[name]
+                    inputs = prepare(blocks)
+                    record = {'case': name, 'source': source, 'samplerate': samplerate, 'blocksize': blocksize}
+                    try:
+                        record.update(measure(factory(samplerate, blocksize), inputs, blocksize, samplerate, repeats))
+                    except Exception as error:
+                        record['error'] = f'{error.__class__.__name__}: {error}'
+                    results.append(record)
+
+    return {
+        'meta': {
+            'audiochains': _package_version(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='audiochains block methods benchmarks')
+    parser.add_argument('--output', '-o', help='json file for the results, stdout by default')
+    parser.add_argument('--cases', nargs='*', choices=list(CASES), help='benchmark cases, all by default')
+    parser.add_argument('--samplerates', nargs='*', type=int, default=list(SAMPLE_RATES))
+    parser.add_argument('--blocksizes', nargs='*', type=int, default=list(BLOCK_SIZES))
+    parser.add_argument('--seconds', type=float, default=2.0, help='duration of synthetic signals')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-playback', action='store_true', help='skip test_playback.wav')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.cases, args.samplerates, args.blocksizes, args.seconds, args.repeats,
+                            not args.no_playback)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
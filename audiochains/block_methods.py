@@ -1,22 +1,180 @@
 import numpy as np
 import parselmouth
 
-from audioop import rms
-from math import log10
-from scipy.signal import butter, filtfilt
+from audioop import rms, tomono
+from math import gcd, log10
+from functools import lru_cache
+from inspect import signature
+from scipy.fft import dct
+from scipy.signal import butter, filtfilt, sosfilt, sosfilt_zi, get_window, firwin
 from abc import ABC, abstractmethod
 from librosa.feature import mfcc, zero_crossing_rate
+from librosa.filters import mel
 from librosa import yin
+from numpy.lib.stride_tricks import sliding_window_view
 
-from typing import Union, List
+from collections import deque
+from typing import Union, List, Optional, Sequence
 
+from audiochains.exceptions import AppException
 from audiochains.output_types import (
     FourierTuple,
+    PitchTuple,
     VoiceRange,
     np_int16_array,
     np_float32_array
 )
 
+_rfft_supports_out = 'out' in signature(np.fft.rfft).parameters
+
+
+@lru_cache(maxsize=16)
+def _hamming_window(length: int, dtype: np.dtype) -> np.ndarray:
+    window = np.hamming(length).astype(dtype)
+    window.setflags(write=False)
+    return window
+
+
+@lru_cache(maxsize=16)
+def _rfft_frequencies(length: int, framerate: float) -> np.ndarray:
+    frequencies = np.fft.rfftfreq(length, 1 / framerate)
+    frequencies.setflags(write=False)
+    return frequencies
+
+
+@lru_cache(maxsize=16)
+def _hann_window(length: int) -> np.ndarray:
+    window = get_window('hann', length, fftbins=True)
+    window.setflags(write=False)
+    return window
+
+
+@lru_cache(maxsize=16)
+def _mel_filterbank(samplerate: float, n_fft: int, n_mels: int) -> np.ndarray:
+    filterbank = mel(sr=samplerate, n_fft=n_fft, n_mels=n_mels)
+    filterbank.setflags(write=False)
+    return filterbank
+
+
+@lru_cache(maxsize=16)
+def _dct_matrix(n_mels: int, n_mfcc: int) -> np.ndarray:
+    matrix = dct(np.eye(n_mels), type=2, norm='ortho', axis=0)[:n_mfcc]
+    matrix.setflags(write=False)
+    return matrix
+
+
+@lru_cache(maxsize=16)
+def _polyphase_filter_bank(up: int, down: int, half_width: int) -> np.ndarray:
+    """
+    The anti-aliasing low-pass filter of the rational resampler split into up phases:
+    bank[phase, tap] = h[phase + tap * up], like the filter of scipy.signal.resample_poly
+    """
+    max_rate = max(up, down)
+    half_length = half_width * max_rate
+    h = firwin(2 * half_length + 1, 1 / max_rate, window=('kaiser', 5.0)) * up
+    taps = -(-len(h) // up)
+    bank = np.zeros(taps * up)
+    bank[:len(h)] = h
+    bank = np.ascontiguousarray(bank.reshape(taps, up).T)
+    bank.setflags(write=False)
+    return bank
+
+
+# Sample formats (sounddevice dtype names) with the width, the dtype of decoded values and their full scale.
+# 8-bit WAV samples are unsigned and decoded with the offset of 128, signed int8 is used by devices only.
+_sample_formats = {
+    'uint8': (1, np.dtype(np.int16), 2 ** 7),
+    'int8': (1, np.dtype(np.int8), 2 ** 7),
+    'int16': (2, np.dtype('<i2'), 2 ** 15),
+    'int24': (3, np.dtype('<i4'), 2 ** 23),
+    'int32': (4, np.dtype('<i4'), 2 ** 31),
+    'float32': (4, np.dtype('<f4'), 1),
+}
+_default_sample_formats = {1: 'uint8', 2: 'int16', 3: 'int24', 4: 'float32'}
+
+
+def _sample_format(sampwidth: int, sample_format: Optional[str]) -> str:
+    if sample_format is None:
+        sample_format = _default_sample_formats.get(sampwidth)
+    if sample_format not in _sample_formats:
+        raise AppException.BlockAudioMethodException(
+            f'unsupported sample format: {sample_format} (sample width {sampwidth})')
+    return sample_format
+
+
+def _decode_samples(in_data, sample_format: str) -> np.ndarray:
+    """
+    Decodes raw little-endian samples: uint8 (centered into int16), int8, int16, int24 (into int32),
+    int32 or float32
+    """
+    if sample_format == 'uint8':
+        return np.subtract(np.frombuffer(in_data, np.uint8), 128, dtype=np.int16)
+    if sample_format != 'int24':
+        return np.frombuffer(in_data, _sample_formats[sample_format][1])
+    raw = np.frombuffer(in_data, np.uint8)
+    n_samples = len(raw) // 3
+    # Each int32 word with the stride of 3 bytes takes one byte before the sample as the lowest byte,
+    # the arithmetic shift drops it and extends the sign of the 24-bit value
+    padded = np.empty(3 * n_samples + 1, dtype=np.uint8)
+    padded[0] = 0
+    padded[1:] = raw[:3 * n_samples]
+    words = np.ndarray(shape=(n_samples,), dtype='<i4', buffer=padded, strides=(3,))
+    return words >> 8
+
+
+def _stream_format(stream) -> tuple:
+    """
+    Returns (sample format, channels) of the input of StreamFromFile (from its WAV format)
+    or of sounddevice based stream (from its dtype)
+    """
+    sample_format, channels = getattr(stream, 'sample_format', None), stream.channels
+    if sample_format is None:
+        sample_format = stream.dtype
+    if isinstance(sample_format, tuple):
+        sample_format = sample_format[0]
+    if isinstance(channels, tuple):
+        channels = channels[0]
+    return sample_format, channels
+
+
+def _window_blocks(windows: Union[float, Sequence[float]], block_duration: Optional[float]) -> np.ndarray:
+    """
+    Converts window lengths in seconds (or in blocks if block_duration is None) into amounts of blocks
+    """
+    windows = np.atleast_1d(np.asarray(windows, dtype=np.float64))
+    if block_duration is not None:
+        windows = windows / block_duration
+    return np.maximum(np.rint(windows), 1).astype(np.int64)
+
+
+def _block_sum_of_squares(data: np.ndarray) -> Union[float, np.ndarray]:
+    return np.einsum('i...,i...->...', data, data, dtype=np.float64)
+
+
+def _block_peak(data: np.ndarray) -> Union[float, np.ndarray]:
+    # Negating the minimum in float, as -(-32768) does not fit int16
+    return np.maximum(data.max(axis=0).astype(np.float64), -data.min(axis=0).astype(np.float64))
+
+
+def _window_dtype(data: np.ndarray) -> np.dtype:
+    return data.dtype if np.issubdtype(data.dtype, np.floating) else np.dtype(np.float64)
+
+
+def _along_time_axis(window: np.ndarray, trailing_axes: int) -> np.ndarray:
+    """
+    Reshapes 1-D window for broadcasting along the time axis followed by trailing_axes (e.g. channels)
+    """
+    return window.reshape((-1,) + (1,) * trailing_axes)
+
+
+def _split_channels(data: np.ndarray, channels: int) -> np.ndarray:
+    """
+    Turns the interleaved samples of the block (or of each block in the batch) into (frames, channels) view
+    """
+    if channels == 1:
+        return data
+    return data.reshape(data.shape[:-1] + (-1, channels))
+
 
 class BlockAudioMethod(ABC):
     """
@@ -34,89 +192,437 @@ class BlockAudioMethod(ABC):
         """
         ...
 
+    def process_batch(self, in_data):
+        """
+        Processing of a batch of blocks stacked along the first axis.
+        By default __call__ is applied to every row, the methods with
+        a vectorized implementation override it.
+        ----
+        Parameters:
+            in_data: sequence of audio data blocks, usually a 2-D numpy array
+        """
+        return [self(block) for block in in_data]
+
+    def reset(self):
+        """
+        Dropping the state carried between blocks. Stateless methods have nothing to reset.
+        """
+        ...
+
 
 class UnpackRawInInt16(BlockAudioMethod):
     """
     Unpacking raw audio data (sequences of bytes) in numpy int16 array.
+    Multichannel data is returned as the view of shape (frames, channels).
+    If the output array is passed, the data is copied into it instead of returning
+    the view over the input buffer (which can be reused by the stream).
     """
 
+    def __init__(self, out: Optional[np_int16_array] = None, channels: int = 1):
+        self.out = out
+        self.channels = channels
+
     def __call__(self, in_data: bytes) -> np_int16_array:
-        return np.frombuffer(in_data, np.int16)
+        data = _split_channels(np.frombuffer(in_data, np.int16), self.channels)
+        if self.out is None:
+            return data
+        out = self.out[:len(data)]
+        np.copyto(out, data)
+        return out
+
+    def process_batch(self, in_data: np.ndarray) -> np_int16_array:
+        return _split_channels(in_data.view(np.int16), self.channels)
 
 
 class UnpackRawInFloat32(BlockAudioMethod):
     """
-    Unpacking raw audio data (sequences of bytes) in the numpy float32 array.
+    Unpacking raw audio data (sequences of bytes) in the numpy float32 array in range [-1, 1).
+    The samples are int16 by default, sampwidth selects unsigned 8-bit (1), int24 (3) or float32 (4)
+    samples, sample_format ('uint8', 'int8', 'int16', 'int24', 'int32', 'float32') sets the format explicitly.
+    Multichannel data is returned as the array of shape (frames, channels).
+    If the output array is passed, the result is written into it in place.
     """
 
+    def __init__(self,
+                 out: Optional[np_float32_array] = None,
+                 channels: int = 1,
+                 sampwidth: int = 2,
+                 sample_format: Optional[str] = None):
+        self.sample_format = _sample_format(sampwidth, sample_format)
+        self.sampwidth = _sample_formats[self.sample_format][0]
+        self.out = out
+        self.channels = channels
+
+    @classmethod
+    def from_stream(cls, stream, out: Optional[np_float32_array] = None) -> 'UnpackRawInFloat32':
+        """
+        Creates the method for the sample format and the amount of channels of the stream
+        """
+        sample_format, channels = _stream_format(stream)
+        return cls(out=out, channels=channels, sample_format=sample_format)
+
     def __call__(self, in_data: bytes) -> np_float32_array:
-        max_int16_value = 2 ** 15
-        data = np.frombuffer(in_data, np.int16)
-        return data.astype(np.float32) / max_int16_value
+        scale = np.float32(1 / _sample_formats[self.sample_format][2])
+        data = _split_channels(_decode_samples(in_data, self.sample_format), self.channels)
+        if self.out is None:
+            if self.sample_format == 'float32':
+                return data.copy()
+            return data.astype(np.float32) * scale
+        out = self.out[:len(data)]
+        np.multiply(data, scale, out=out, casting='unsafe')
+        return out
+
+    def process_batch(self, in_data: np.ndarray) -> np_float32_array:
+        data = _decode_samples(in_data.reshape(-1), self.sample_format).reshape(len(in_data), -1)
+        full_scale = np.float32(_sample_formats[self.sample_format][2])
+        return _split_channels(data, self.channels).astype(np.float32) / full_scale
+
+
+class UnpackRawSamples(BlockAudioMethod):
+    """
+    Unpacking raw audio data in the numpy array of its own sample type without scaling:
+    int16 for unsigned 8-bit samples shifted to zero, int8, int16, int32 for int24 and int32 values
+    or float32, according to sampwidth or sample_format as in UnpackRawInFloat32.
+    Multichannel data is returned as the array of shape (frames, channels).
+    """
+
+    def __init__(self, sampwidth: int = 2, channels: int = 1, sample_format: Optional[str] = None):
+        self.sample_format = _sample_format(sampwidth, sample_format)
+        self.sampwidth = _sample_formats[self.sample_format][0]
+        self.channels = channels
+
+    @classmethod
+    def from_stream(cls, stream) -> 'UnpackRawSamples':
+        sample_format, channels = _stream_format(stream)
+        return cls(channels=channels, sample_format=sample_format)
+
+    def __call__(self, in_data: bytes) -> np.ndarray:
+        return _split_channels(_decode_samples(in_data, self.sample_format), self.channels)
+
+    def process_batch(self, in_data: np.ndarray) -> np.ndarray:
+        data = _decode_samples(in_data.reshape(-1), self.sample_format).reshape(len(in_data), -1)
+        return _split_channels(data, self.channels)
+
+
+class PackFloat32InRaw(BlockAudioMethod):
+    """
+    Packing float samples in range [-1, 1) into raw bytes of the passed sample width or format
+    (as in UnpackRawInFloat32), which can be played or written by WriterInWAV.
+    Arrays of shape (frames, channels) are interleaved.
+    """
+
+    def __init__(self, sampwidth: int = 2, sample_format: Optional[str] = None):
+        self.sample_format = _sample_format(sampwidth, sample_format)
+        self.sampwidth = _sample_formats[self.sample_format][0]
+
+    @classmethod
+    def from_stream(cls, stream) -> 'PackFloat32InRaw':
+        return cls(sample_format=_stream_format(stream)[0])
+
+    def __call__(self, in_data: np_float32_array) -> bytes:
+        if self.sample_format == 'float32':
+            return np.asarray(in_data, dtype='<f4').tobytes()
+        full_scale = _sample_formats[self.sample_format][2]
+        samples = np.clip(np.rint(np.multiply(in_data, full_scale, dtype=np.float64)), -full_scale, full_scale - 1)
+        if self.sample_format == 'uint8':
+            return (samples + 128).astype(np.uint8).tobytes()
+        if self.sample_format == 'int24':
+            return samples.astype('<i4').reshape(-1, 1).view(np.uint8)[:, :3].tobytes()
+        return samples.astype(_sample_formats[self.sample_format][1]).tobytes()
 
 
 class RMSFromBytes(BlockAudioMethod):
     """
     Calculating root mean square (RMS) value of the input raw audio block with a certain sample width.
+    For stereo blocks the array of RMS values of both channels is returned.
     """
 
-    def __init__(self, width: int = 2):
+    def __init__(self, width: int = 2, channels: int = 1):
         self.width = width
+        self.channels = channels
 
-    def __call__(self, in_data: bytes) -> int:
+    def __call__(self, in_data: bytes) -> Union[int, np.ndarray]:
+        if self.channels == 2:
+            return np.array([
+                rms(tomono(in_data, self.width, 1, 0), self.width),
+                rms(tomono(in_data, self.width, 0, 1), self.width)
+            ])
         return rms(in_data, self.width)
 
 
 class RMSFromArray(BlockAudioMethod):
     """
     Calculating root mean square (RMS) value of the input numpy array.
+    For the array of shape (frames, channels) RMS of each channel is returned.
     """
 
-    def __call__(self, in_data: Union[np_int16_array, np_float32_array]) -> int:
+    def __call__(self, in_data: Union[np_int16_array, np_float32_array]) -> Union[int, np.ndarray]:
         in_data = in_data.astype(np.float32)
+        if in_data.ndim > 1:
+            return np.rint(np.sqrt((in_data * in_data).sum(axis=0) / len(in_data))).astype(np.int64)
         return round(np.sqrt((in_data * in_data).sum() / len(in_data)))
 
+    def process_batch(self, in_data: np.ndarray) -> np.ndarray:
+        in_data = np.asarray(in_data, dtype=np.float32)
+        return np.rint(np.sqrt((in_data * in_data).mean(axis=1))).astype(np.int64)
+
+
+class RunningRMS(BlockAudioMethod):
+    """
+    RMS of the input numpy array over the latest window of blocks, for one or several windows at once.
+    Sums of squares of blocks are kept in the circular buffer and the sum of each window
+    is updated by the new and the leaving block only, so the cost doesn't depend on window lengths.
+    Windows are set in seconds with block_duration (blocksize / samplerate) or in blocks without it.
+    Returns float RMS for the single window or the array with one RMS per window,
+    both can be passed to DBLog10 and SoundPressureThreshold.
+    For the array of shape (frames, channels) RMS of each channel is returned.
+
+    Example
+    ------
+        ChainOfMethods(
+            UnpackRawInInt16(),
+            RunningRMS(windows=(1, 10, 60), block_duration=1024 / 16000),
+            DBLog10()
+        )
+    """
+
+    def __init__(self, windows: Union[float, Sequence[float]] = 1.0, block_duration: Optional[float] = None):
+        self.windows = _window_blocks(windows, block_duration)
+        self.single = np.ndim(windows) == 0
+        self.capacity = int(self.windows.max())
+        self.reset()
+
+    def reset(self):
+        self.sums = None
+        self.totals = None
+        self.frames = np.zeros(self.capacity, dtype=np.int64)
+        self.frame_totals = np.zeros(len(self.windows), dtype=np.int64)
+        self.count = 0
+
+    def __call__(self, data: Union[np_int16_array, np_float32_array]) -> Union[float, np.ndarray]:
+        block_sum = _block_sum_of_squares(data)
+        if self.sums is None:
+            self.sums = np.zeros((self.capacity,) + np.shape(block_sum))
+            self.totals = np.zeros((len(self.windows),) + np.shape(block_sum))
+
+        position = self.count % self.capacity
+        leaving = (self.count - self.windows) % self.capacity
+        full = self.count >= self.windows
+        self.totals += block_sum - np.where(_along_time_axis(full, np.ndim(block_sum)), self.sums[leaving], 0)
+        self.frame_totals += len(data) - np.where(full, self.frames[leaving], 0)
+        self.sums[position] = block_sum
+        self.frames[position] = len(data)
+        self.count += 1
+        if position == self.capacity - 1:
+            self._recalculate()
+
+        rms = np.sqrt(np.maximum(self.totals, 0) / _along_time_axis(self.frame_totals, np.ndim(block_sum)))
+        return rms[0] if self.single else rms
+
+    def _recalculate(self) -> None:
+        """
+        Sums the windows over again once per buffer turn, so rounding errors of updates don't accumulate
+        """
+        for index, window in enumerate(self.windows):
+            latest = (self.count - 1 - np.arange(min(window, self.count))) % self.capacity
+            self.totals[index] = self.sums[latest].sum(axis=0)
+
+
+class RunningPeak(BlockAudioMethod):
+    """
+    Absolute peak of the input numpy array over the latest window of blocks, for one or several windows.
+    Each window keeps the monotonic queue of block peaks, so each block costs amortized O(1).
+    Windows and the output are the same as in RunningRMS.
+    """
+
+    def __init__(self, windows: Union[float, Sequence[float]] = 1.0, block_duration: Optional[float] = None):
+        self.windows = _window_blocks(windows, block_duration)
+        self.single = np.ndim(windows) == 0
+        self.reset()
+
+    def reset(self):
+        self.queues = None
+        self.count = 0
+
+    def __call__(self, data: Union[np_int16_array, np_float32_array]) -> Union[float, np.ndarray]:
+        block_peak = _block_peak(data)
+        peaks = np.atleast_1d(block_peak)
+        if self.queues is None:
+            self.queues = [[deque() for _ in peaks] for _ in self.windows]
+
+        result = np.empty((len(self.windows), len(peaks)))
+        for window_index, window in enumerate(self.windows):
+            for channel, peak in enumerate(peaks):
+                queue = self.queues[window_index][channel]
+                while queue and queue[-1][1] <= peak:
+                    queue.pop()
+                queue.append((self.count, peak))
+                if queue[0][0] <= self.count - window:
+                    queue.popleft()
+                result[window_index, channel] = queue[0][1]
+        self.count += 1
+
+        result = result.reshape((len(self.windows),) + np.shape(block_peak))
+        return result[0] if self.single else result
+
+
+class ExponentialRMS(BlockAudioMethod):
+    """
+    RMS of the input numpy array smoothed by the exponential moving average of the mean square
+    with one or several time constants (in seconds with block_duration or in blocks without it).
+    The state is a single value per time constant, the output is the same as in RunningRMS.
+    """
+
+    def __init__(self, time_constants: Union[float, Sequence[float]] = 1.0, block_duration: Optional[float] = None):
+        self.single = np.ndim(time_constants) == 0
+        time_constants = np.atleast_1d(np.asarray(time_constants, dtype=np.float64))
+        if block_duration is not None:
+            time_constants = time_constants / block_duration
+        self.alphas = np.exp(-1 / np.maximum(time_constants, 1e-9))
+        self.reset()
+
+    def reset(self):
+        self.mean_square = None
+
+    def __call__(self, data: Union[np_int16_array, np_float32_array]) -> Union[float, np.ndarray]:
+        block_mean_square = _block_sum_of_squares(data) / len(data)
+        alphas = _along_time_axis(self.alphas, np.ndim(block_mean_square))
+        if self.mean_square is None:
+            self.mean_square = np.broadcast_to(block_mean_square, np.shape(alphas)[:1] + np.shape(block_mean_square))
+        self.mean_square = alphas * self.mean_square + (1 - alphas) * block_mean_square
+        rms = np.sqrt(self.mean_square)
+        return rms[0] if self.single else rms
+
+
+class ExponentialPeak(BlockAudioMethod):
+    """
+    Peak meter with exponential release: the block peak is taken at once
+    and the held value decays with the release time (in seconds with block_duration or in blocks).
+    """
+
+    def __init__(self, release: float = 1.0, block_duration: Optional[float] = None):
+        if block_duration is not None:
+            release = release / block_duration
+        self.alpha = np.exp(-1 / max(release, 1e-9))
+        self.reset()
+
+    def reset(self):
+        self.peak = None
+
+    def __call__(self, data: Union[np_int16_array, np_float32_array]) -> Union[float, np.ndarray]:
+        block_peak = _block_peak(data)
+        self.peak = block_peak if self.peak is None else np.maximum(block_peak, self.alpha * self.peak)
+        return self.peak
+
 
 class DBLog10(BlockAudioMethod):
     """
-    Calculating logarithmic relative value of input int vale
+    Calculating logarithmic relative value of input int vale.
+    Arrays (per channel, per window or per block values) are processed at once by np.log10.
+    Without floor non-positive values give 0 as before, with floor the result is clipped from below
+    by floor (e.g. -100.0 for RMS of float samples). The value is divided by reference first
+    (e.g. 2 ** 15 for dBFS of int16 RMS) and rounded to decimals if they are set.
     """
 
+    def __init__(self, floor: Optional[float] = None, reference: float = 1.0, decimals: Optional[int] = 2):
+        self.floor = floor
+        self.reference = reference
+        self.decimals = decimals
+
     def __call__(self, in_data: int):
+        if np.ndim(in_data):
+            return self.process_batch(in_data)
         if in_data > 0:
-            return round(20 * log10(in_data), 2)
+            db = 20 * log10(in_data / self.reference)
+            if self.floor is not None:
+                db = max(db, self.floor)
+        else:
+            db = 0 if self.floor is None else self.floor
+        return db if self.decimals is None else round(db, self.decimals)
+
+    def process_batch(self, in_data: np.ndarray) -> np.ndarray:
+        in_data = np.asarray(in_data, dtype=np.float64) / self.reference
+        if self.floor is None:
+            db = 20 * np.log10(np.where(in_data > 0, in_data, 1))
         else:
-            return 0
+            db = 20 * np.log10(np.maximum(in_data, np.finfo(np.float64).tiny))
+            np.maximum(db, self.floor, out=db)
+        return db if self.decimals is None else np.round(db, self.decimals, out=db)
 
 
 class HammingWindow(BlockAudioMethod):
     """
     Superimposing the hamming window on the input numpy array.
+    Windows are cached by length and dtype.
     """
 
     def __call__(self, data: Union[np_int16_array, np_float32_array]) -> np_float32_array:
-        return data * np.hamming(len(data))
+        window = _hamming_window(len(data), _window_dtype(data))
+        return data * _along_time_axis(window, data.ndim - 1)
+
+    def process_batch(self, data: np.ndarray) -> np_float32_array:
+        window = _hamming_window(data.shape[1], _window_dtype(data))
+        return data * _along_time_axis(window, data.ndim - 2)
 
 
 class FourierTransform(BlockAudioMethod):
     """
     Calculating the fourier transform on the input numpy float32 array with a certain framerate.
+    The amplitude of multichannel block has shape (frequencies, channels).
     """
 
     def __init__(self, framerate: int):
         self.framerate = framerate
 
     def __call__(self, in_data: np_float32_array) -> FourierTuple:
-        n = len(in_data)
-        d = 1 / self.framerate
-        hs = np.abs(np.fft.rfft(in_data))
-        fs = np.fft.rfftfreq(n, d)
+        hs = np.abs(np.fft.rfft(in_data, axis=0))
+        fs = _rfft_frequencies(len(in_data), self.framerate)
         return FourierTuple(amplitude=hs, frequency=fs)
 
+    def process_batch(self, in_data: np.ndarray) -> FourierTuple:
+        """
+        Returns a single FourierTuple whose amplitude has one row per block.
+        """
+        hs = np.abs(np.fft.rfft(in_data, axis=1))
+        fs = _rfft_frequencies(in_data.shape[1], self.framerate)
+        return FourierTuple(amplitude=hs, frequency=fs)
+
+
+class HammingSpectrum(BlockAudioMethod):
+    """
+    Fused hamming window, fourier transform and magnitude calculation
+    on blocks of a certain size. All intermediate arrays are preallocated,
+    so the returned FourierTuple is overwritten by the next call.
+    Multichannel blocks of shape (frames, channels) are processed per channel.
+    """
+
+    def __init__(self, framerate: int, blocksize: int, channels: int = 1):
+        self.framerate = framerate
+        self.blocksize = blocksize
+        channel_shape = (channels,) if channels > 1 else ()
+        self.window = _along_time_axis(_hamming_window(blocksize, np.dtype(np.float64)), len(channel_shape))
+        self.frequency = _rfft_frequencies(blocksize, framerate)
+        self.windowed = np.empty((blocksize,) + channel_shape, dtype=np.float64)
+        self.spectrum = np.empty((blocksize // 2 + 1,) + channel_shape, dtype=np.complex128)
+        self.amplitude = np.empty((blocksize // 2 + 1,) + channel_shape, dtype=np.float64)
+
+    def __call__(self, in_data: Union[np_int16_array, np_float32_array]) -> FourierTuple:
+        if len(in_data) != self.blocksize:
+            return FourierTransform(self.framerate)(HammingWindow()(in_data.astype(np.float64)))
+
+        np.multiply(in_data, self.window, out=self.windowed)
+        if _rfft_supports_out:
+            np.fft.rfft(self.windowed, axis=0, out=self.spectrum)
+        else:
+            self.spectrum[:] = np.fft.rfft(self.windowed, axis=0)
+        np.abs(self.spectrum, out=self.amplitude)
+        return FourierTuple(amplitude=self.amplitude, frequency=self.frequency)
+
 
 class MFCC(BlockAudioMethod):
     """
-    Calculating certain number of mfcc coefficients of the input numpy float32 array
+    Calculating certain number of mfcc coefficients of the input numpy float32 array.
+    Coefficients of multichannel block have shape (channels, n_mfcc, frames).
     """
 
     def __init__(self, n_mfcc: int, freq_rate: int):
@@ -125,12 +631,57 @@ class MFCC(BlockAudioMethod):
         self.freq_rate = freq_rate
 
     def __call__(self, data: Union[float, np.float32]):
-        return mfcc(data, n_mfcc=self.n_mfcc, sr=self.freq_rate)
+        return mfcc(y=data.T, n_mfcc=self.n_mfcc, sr=self.freq_rate)
+
+
+class StreamingMFCC(BlockAudioMethod):
+    """
+    Calculating mfcc coefficients of the audio stream frame by frame.
+    The mel filterbank and DCT matrices are built once per parameters set,
+    the samples which do not fill the next frame yet are carried to the next block,
+    so each call returns only the new frames as an array of shape (n_mfcc, n_new_frames)
+    or (channels, n_mfcc, n_new_frames) for multichannel blocks of shape (frames, channels).
+    """
+
+    def __init__(self,
+                 samplerate: int,
+                 n_mfcc: int = 20,
+                 n_fft: int = 2048,
+                 hop_length: int = 512,
+                 n_mels: int = 128):
+        self.samplerate = samplerate
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.window = _hann_window(n_fft)
+        self.filterbank = _mel_filterbank(samplerate, n_fft, n_mels)
+        self.dct_matrix = _dct_matrix(n_mels, n_mfcc)
+        self.tail = None
+
+    def reset(self):
+        self.tail = None
+
+    def __call__(self, in_data: np_float32_array) -> np_float32_array:
+        data = in_data if self.tail is None else np.concatenate((self.tail, in_data))
+        if len(data) < self.n_fft:
+            self.tail = data.copy()
+            return np.zeros(data.shape[1:] + (self.n_mfcc, 0), dtype=np.float32)
+
+        frames = sliding_window_view(data, self.n_fft, axis=0)[::self.hop_length]
+        self.tail = data[len(frames) * self.hop_length:].copy()
+
+        power = np.abs(np.fft.rfft(frames * self.window, axis=-1)) ** 2
+        log_mel = 10 * np.log10(np.maximum(power @ self.filterbank.T, 1e-10))
+        return np.moveaxis(log_mel @ self.dct_matrix.T, 0, -1).astype(np.float32)
 
 
 class BandPassFilter(BlockAudioMethod):
     """
-    Application of the butterworth bandpass filter
+    Application of the butterworth bandpass filter.
+    By default each block is filtered separately by zero-phase filtfilt.
+    In streaming mode the causal filter in second-order sections is used and its state
+    is carried between blocks, so the output is continuous at the block boundaries.
+    Interleaved multichannel blocks (or arrays of shape (frames, channels)) are filtered per channel.
     """
 
     def __init__(self,
@@ -138,15 +689,103 @@ class BandPassFilter(BlockAudioMethod):
                  low_cut: int = 200,
                  high_cut: int = 1000,
                  order: int = 3,
-                 out_type=np.int16):
+                 out_type=np.int16,
+                 streaming: bool = False,
+                 channels: int = 1):
         self.nyq_frequency = 0.5 * sample_rate
         self.low = low_cut / self.nyq_frequency
         self.high = high_cut / self.nyq_frequency
         self.b, self.a = butter(order, Wn=(self.low, self.high), btype='bandpass', analog=False)
+        self.sos = butter(order, Wn=(self.low, self.high), btype='bandpass', analog=False, output='sos')
         self.out_type = out_type
+        self.streaming = streaming
+        self.channels = channels
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
 
     def __call__(self, data: np_float32_array):
-        return filtfilt(self.b, self.a, data).astype(self.out_type)
+        interleaved = data.ndim == 1 and self.channels > 1
+        frames = data.reshape(-1, self.channels) if interleaved else data
+        if self.streaming:
+            filtered = self._filter_stream(frames)
+        else:
+            filtered = filtfilt(self.b, self.a, frames, axis=0)
+        if interleaved:
+            filtered = filtered.reshape(-1)
+        return filtered.astype(self.out_type)
+
+    def _filter_stream(self, frames: np_float32_array) -> np.ndarray:
+        if self.zi is None:
+            zi = sosfilt_zi(self.sos)
+            self.zi = (zi[:, :, np.newaxis] if frames.ndim == 2 else zi) * frames[0]
+        filtered, self.zi = sosfilt(self.sos, frames, axis=0, zi=self.zi)
+        return filtered
+
+
+class StreamingResample(BlockAudioMethod):
+    """
+    Streaming rational resampling from in_rate to out_rate by the polyphase filter.
+    The filter bank is designed once per rate ratio and the input history is carried between blocks,
+    so each block gives exactly the amount of samples which has become available:
+    after T input samples there are ceil(T * out_rate / in_rate) output samples in total.
+    The filter is causal, the output is delayed by `delay` output samples.
+    Interleaved multichannel blocks (or arrays of shape (frames, channels)) are resampled per channel.
+    """
+
+    def __init__(self,
+                 in_rate: int,
+                 out_rate: int = 16000,
+                 half_width: int = 10,
+                 channels: int = 1,
+                 out_type=np.float32):
+        divisor = gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+        self.channels = channels
+        self.out_type = out_type
+        self.bank = _polyphase_filter_bank(self.up, self.down, half_width) if self.up != self.down else None
+        self.delay = half_width * max(self.up, self.down) / self.down
+        self.history = None
+        self.consumed = 0
+
+    def reset(self):
+        self.history = None
+        self.consumed = 0
+
+    def __call__(self, data: np_float32_array) -> np_float32_array:
+        interleaved = data.ndim == 1 and self.channels > 1
+        frames = data.reshape(-1, self.channels) if interleaved else data
+        if self.bank is None:
+            resampled = frames
+        else:
+            resampled = self._resample(frames)
+        if interleaved:
+            resampled = resampled.reshape(-1)
+        return resampled.astype(self.out_type, copy=False)
+
+    def _resample(self, frames: np.ndarray) -> np.ndarray:
+        taps = self.bank.shape[1]
+        if self.history is None:
+            self.history = np.zeros((taps - 1,) + frames.shape[1:], dtype=_window_dtype(frames))
+        samples = np.concatenate((self.history, frames))
+
+        # Output n takes the phase (n * down) % up and the input samples ending at (n * down) // up
+        total = self.consumed + len(frames)
+        first, last = -(-self.consumed * self.up // self.down), -(-total * self.up // self.down)
+        positions = np.arange(first, last, dtype=np.int64) * self.down
+        ends = positions // self.up - self.consumed + taps - 1
+        indices = ends[:, np.newaxis] - np.arange(taps)
+        bank = self.bank[positions % self.up].astype(samples.dtype, copy=False)
+        if samples.ndim == 1:
+            resampled = np.einsum('ij,ij->i', samples[indices], bank)
+        else:
+            resampled = np.einsum('ijc,ij->ic', samples[indices], bank)
+
+        self.history = samples[len(samples) - taps + 1:]
+        self.consumed = total
+        return resampled
 
 
 class SoundPressureThreshold(BlockAudioMethod):
@@ -161,8 +800,11 @@ class SoundPressureThreshold(BlockAudioMethod):
         self.silence_value = silence_value
         self.whisper_value = whisper_value
         self.normal_value = normal_value
+        self.edges = np.array([silence_value, whisper_value, normal_value])
 
     def __call__(self, in_data: Union[int, float, np.float32]) -> VoiceRange:
+        if np.ndim(in_data):
+            return self.process_batch(in_data)
         if in_data <= self.silence_value:
             return VoiceRange.SILENCE
         elif in_data <= self.whisper_value:
@@ -171,11 +813,19 @@ class SoundPressureThreshold(BlockAudioMethod):
             return VoiceRange.NORMAL
         elif in_data > self.normal_value:
             return VoiceRange.LOUD
-        
+
+    def process_batch(self, in_data: np.ndarray) -> np.ndarray:
+        """
+        Returns the int8 array of VoiceRange codes, one per input value (block, channel or frame).
+        """
+        return np.searchsorted(self.edges, np.asarray(in_data), side='left').astype(np.int8)
+
+
 class ZeroCrossingRate(BlockAudioMethod):
     """
     Calculation of the rate at which a signal changes
-    from positive to zero to negative or from negative to zero to positive
+    from positive to zero to negative or from negative to zero to positive.
+    For multichannel block the rate of each channel is returned.
     """
     def __init__(
             self,
@@ -190,10 +840,10 @@ class ZeroCrossingRate(BlockAudioMethod):
 
     def __call__(self, in_data: np_float32_array) -> np_float32_array:
         avg_zcr = np.mean(zero_crossing_rate(
-            y=in_data,
+            y=in_data.T,
             frame_length=self.frame_length,
             hop_length=self.win_length,
-            ))
+            ), axis=(-2, -1))
         
         avg_zcr *= self.frame_length
         frame_duration = self.frame_length / self.frame_rate
@@ -201,9 +851,104 @@ class ZeroCrossingRate(BlockAudioMethod):
         return avg_zcr / frame_duration
 
     
+class VoiceActivityDetector(BlockAudioMethod):
+    """
+    Streaming voice activity detector adapting to the noise floor.
+    The block is split into frames of frame_duration seconds, each frame is speech-like
+    if its energy is threshold_db above the noise floor and its zero-crossing rate (per sample)
+    doesn't exceed zcr_max, as broadband noise crosses zero much more often than voice;
+    frames strong_db above the floor are taken regardless of the rate.
+    The block is active if the share of its speech-like frames is at least min_active_ratio,
+    after that hangover_blocks following blocks are active too.
+    The noise floor follows the quietest frame of each block down at once
+    and rises by floor_rise_db per second only, so it is not absorbed by speech.
+
+    With gate=True the active block is passed through and None is returned otherwise,
+    so the ChainOfMethods stops and the expensive methods after the detector are skipped:
+
+        ChainOfMethods(UnpackRawInFloat32(), VoiceActivityDetector(16000), StreamingMFCC(16000))
+
+    With gate=False the decision itself is returned, e.g. for SegmentedWriterInWAV gate.
+    Empty blocks are never active.
+    For the array of shape (frames, channels) the channels are mixed for detection.
+    """
+
+    def __init__(self,
+                 samplerate: int = 16000,
+                 frame_duration: float = 0.02,
+                 threshold_db: float = 9.0,
+                 strong_db: float = 20.0,
+                 zcr_max: float = 0.4,
+                 min_active_ratio: float = 0.2,
+                 hangover_blocks: int = 4,
+                 floor_rise_db: float = 3.0,
+                 gate: bool = True):
+        self.samplerate = samplerate
+        self.frame_length = max(int(frame_duration * samplerate), 1)
+        self.threshold_db = threshold_db
+        self.strong_db = strong_db
+        self.zcr_max = zcr_max
+        self.min_active_ratio = min_active_ratio
+        self.hangover_blocks = hangover_blocks
+        self.floor_rise_db = floor_rise_db
+        self.gate = gate
+        self.reset()
+
+    def reset(self):
+        self.noise_floor_db = None
+        self.hangover_left = 0
+        self.active = False
+
+    def __call__(self, in_data: Union[np_int16_array, np_float32_array]):
+        self.active = self.detect(in_data)
+        if not self.gate:
+            return self.active
+        return in_data if self.active else None
+
+    def process_batch(self, in_data: np.ndarray):
+        decisions = [self.detect(block) for block in in_data]
+        if decisions:
+            self.active = decisions[-1]
+        if not self.gate:
+            return np.array(decisions, dtype=bool)
+        if all(decisions):
+            return in_data
+        return [block if active else None for block, active in zip(in_data, decisions)]
+
+    def detect(self, in_data: Union[np_int16_array, np_float32_array]) -> bool:
+        samples = in_data.mean(axis=1) if in_data.ndim > 1 else in_data
+        if len(samples) < 1:
+            return False
+        frame_length = min(self.frame_length, len(samples))
+        n_frames = len(samples) // frame_length
+        frames = samples[:n_frames * frame_length].reshape(n_frames, frame_length)
+
+        energy_db = 10 * np.log10(_block_sum_of_squares(frames.T) / frame_length + 1e-10)
+        crossings = np.count_nonzero(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+        zcr = crossings / frame_length
+
+        quietest = energy_db.min()
+        if self.noise_floor_db is None:
+            self.noise_floor_db = quietest
+        else:
+            rise = self.floor_rise_db * len(samples) / self.samplerate
+            self.noise_floor_db = min(quietest, self.noise_floor_db + rise)
+
+        above_floor = energy_db - self.noise_floor_db
+        speech_like = (above_floor > self.threshold_db) & (zcr <= self.zcr_max) | (above_floor > self.strong_db)
+        if np.count_nonzero(speech_like) >= self.min_active_ratio * n_frames and speech_like.any():
+            self.hangover_left = self.hangover_blocks
+            return True
+        if self.hangover_left:
+            self.hangover_left -= 1
+            return True
+        return False
+
+
 class YIN(BlockAudioMethod):
     """
-    YIN, a fundamental frequency estimator for speech and music
+    YIN, a fundamental frequency estimator for speech and music.
+    For multichannel block the mean pitch of each channel is returned.
     http://audition.ens.fr/adc/pdf/2002_JASA_YIN.pdf
     """
     def __init__(
@@ -221,41 +966,203 @@ class YIN(BlockAudioMethod):
     def __call__(self, in_data: np_float32_array) -> np_float32_array:
         return np.mean(
             yin(
-                in_data,
+                in_data.T,
                 fmin=self.f_min,
                 fmax=self.f_max,
                 sr=self.frame_rate
-            )
+            ),
+            axis=-1
         )
     
+class StreamingYIN(BlockAudioMethod):
+    """
+    YIN fundamental frequency estimator working on the audio stream.
+    The difference function of all frames in the block is calculated at once
+    through the FFT-based autocorrelation and the samples which do not fill
+    the next frame yet are carried to the next block.
+    Returns PitchTuple with f0 (0 for unvoiced frames) and confidence (1 - aperiodicity) of each new frame,
+    for multichannel blocks of shape (frames, channels) both arrays have shape (channels, n_new_frames).
+    http://audition.ens.fr/adc/pdf/2002_JASA_YIN.pdf
+    """
+
+    def __init__(self,
+                 frame_rate: int = 16000,
+                 f_min: int = 50,
+                 f_max: int = 500,
+                 frame_length: int = 1024,
+                 hop_length: int = 256,
+                 threshold: float = 0.1):
+        super().__init__()
+        self.frame_rate = frame_rate
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.threshold = threshold
+        self.tau_min = max(int(frame_rate // f_max), 1)
+        self.tau_max = int(np.ceil(frame_rate / f_min))
+        self.win_length = frame_length - self.tau_max - 1
+        if self.win_length <= self.tau_max:
+            raise AppException.BlockAudioMethodException(f'frame_length {frame_length} is too short for f_min {f_min} Hz')
+        self.n_fft = 1 << int(np.ceil(np.log2(frame_length + self.win_length)))
+        self.tail = None
+
+    def reset(self):
+        self.tail = None
+
+    def __call__(self, in_data: np_float32_array) -> PitchTuple:
+        data = in_data if self.tail is None else np.concatenate((self.tail, in_data))
+        if len(data) < self.frame_length:
+            self.tail = data.copy()
+            empty = np.zeros(data.shape[1:] + (0,))
+            return PitchTuple(frequency=empty, confidence=empty)
+
+        frames = sliding_window_view(data, self.frame_length, axis=0)[::self.hop_length]
+        self.tail = data[len(frames) * self.hop_length:].copy()
+        cmnd = self._cumulative_mean_normalized_difference(frames.reshape(-1, self.frame_length))
+        pitch = self._pick_periods(cmnd)
+        if data.ndim == 1:
+            return pitch
+        return PitchTuple(
+            frequency=pitch.frequency.reshape(len(frames), -1).T,
+            confidence=pitch.confidence.reshape(len(frames), -1).T
+        )
+
+    def _cumulative_mean_normalized_difference(self, frames: np.ndarray) -> np.ndarray:
+        lags = np.arange(self.tau_max + 2)
+        squares = np.concatenate((np.zeros((len(frames), 1)), np.cumsum(frames ** 2, axis=1)), axis=1)
+        energy = squares[:, self.win_length:self.win_length + 1]
+        lagged_energy = squares[:, lags + self.win_length] - squares[:, lags]
+
+        window_spectrum = np.fft.rfft(frames[:, :self.win_length], self.n_fft, axis=1)
+        frames_spectrum = np.fft.rfft(frames, self.n_fft, axis=1)
+        correlation = np.fft.irfft(np.conj(window_spectrum) * frames_spectrum, self.n_fft, axis=1)[:, lags]
+
+        difference = np.maximum(energy + lagged_energy - 2 * correlation, 0)
+        difference[:, 0] = 0
+        cumulative_mean = np.cumsum(difference[:, 1:], axis=1) / lags[1:]
+        cmnd = np.ones_like(difference)
+        np.divide(difference[:, 1:], cumulative_mean, out=cmnd[:, 1:], where=cumulative_mean > 0)
+        return cmnd
+
+    def _pick_periods(self, cmnd: np.ndarray) -> PitchTuple:
+        rows = np.arange(len(cmnd))
+        candidates = cmnd[:, self.tau_min:self.tau_max + 1]
+        local_minima = candidates <= cmnd[:, self.tau_min + 1:self.tau_max + 2]
+        below_threshold = local_minima & (candidates < self.threshold)
+        voiced = below_threshold.any(axis=1)
+        tau = np.where(voiced, below_threshold.argmax(axis=1), candidates.argmin(axis=1)) + self.tau_min
+
+        left, center, right = cmnd[rows, tau - 1], cmnd[rows, tau], cmnd[rows, tau + 1]
+        curvature = left - 2 * center + right
+        shift = np.zeros(len(tau))
+        np.divide(left - right, 2 * curvature, out=shift, where=curvature > 0)
+        frequency = np.where(voiced, self.frame_rate / (tau + np.clip(shift, -1, 1)), 0)
+        return PitchTuple(frequency=frequency, confidence=np.clip(1 - center, 0, 1))
+
+
 class PraatPitch(BlockAudioMethod):
     """
-    Performs an access to Pratt commands for Pitch calculatiion
+    Performs an access to Pratt commands for Pitch calculatiion.
+    If analysis_window (in seconds) is passed, blocks are accumulated in the reused
+    Praat Sound objects and the pitch is calculated once per window; between the windows
+    the mean pitch of the latest analysed window is returned.
+    For multichannel blocks of shape (frames, channels) the pitch of each channel is returned.
     """
     def __init__(self,
             frame_rate: int = 16000,
             f_min: int = 50,
-            f_max: int = 500
+            f_max: int = 500,
+            analysis_window: Optional[float] = None
         ) -> None:
         super().__init__()
         self.frame_rate = frame_rate
         self.f_min = f_min
         self.f_max = f_max
+        self.analysis_window = analysis_window
+        self.sounds = None
+        self.filled = 0
+        self.last_pitch = 0
 
-    def __call__(self, in_data: np_float32_array) -> np_float32_array:
-        in_data = parselmouth.Sound(in_data, self.frame_rate)
-        pitch = in_data.to_pitch(
+    def reset(self):
+        self.filled = 0
+        self.last_pitch = 0 if self.sounds is None or len(self.sounds) == 1 else np.zeros(len(self.sounds))
+
+    def _to_pitch(self, sound: parselmouth.Sound) -> parselmouth.Pitch:
+        return sound.to_pitch(
             time_step=None,
             pitch_floor=self.f_min,
             pitch_ceiling=self.f_max,
         )
 
-        pitch_values = pitch.selected_array['frequency']
+    @staticmethod
+    def _mean_pitch(pitch_values: np.ndarray):
         valid_pitch_values = pitch_values[pitch_values > 0]
-    
         if len(valid_pitch_values) > 0:
-            mean_pitch = np.mean(valid_pitch_values)
-        else:
-            mean_pitch = 0
-        
-        return mean_pitch
+            return np.mean(valid_pitch_values)
+        return 0
+
+    def __call__(self, in_data: np_float32_array) -> np_float32_array:
+        if self.analysis_window:
+            return self._accumulate(in_data)
+        if in_data.ndim > 1:
+            return np.array([self(channel) for channel in in_data.T])
+
+        pitch = self._to_pitch(parselmouth.Sound(in_data, self.frame_rate))
+        return self._mean_pitch(pitch.selected_array['frequency'])
+
+    def _accumulate(self, in_data: np_float32_array):
+        frames = in_data.reshape(len(in_data), -1)
+        if self.sounds is None:
+            window_length = int(self.analysis_window * self.frame_rate)
+            self.sounds = [
+                parselmouth.Sound(np.zeros(window_length), self.frame_rate) for _ in range(frames.shape[1])
+            ]
+            self.reset()
+        windows = [sound.values[0] for sound in self.sounds]
+
+        while len(frames):
+            size = min(len(frames), len(windows[0]) - self.filled)
+            for channel, window in enumerate(windows):
+                window[self.filled:self.filled + size] = frames[:size, channel]
+            self.filled += size
+            frames = frames[size:]
+            if self.filled == len(windows[0]):
+                pitch = [self._mean_pitch(self._to_pitch(sound).selected_array['frequency']) for sound in self.sounds]
+                self.last_pitch = pitch[0] if in_data.ndim == 1 else np.array(pitch)
+                self.filled = 0
+        return self.last_pitch
+
+    def process_file(self, file_stream) -> np.ndarray:
+        """
+        Calculates the pitch over the whole opened StreamFromFile by one Praat call per channel
+        and returns the mean pitch of each block (0 for blocks without voiced frames),
+        as the array of shape (n_blocks,) or (channels, n_blocks).
+        For the stream with hop_size the blocks are the overlapping windows read by apply.
+        """
+        file_stream.seek(0)
+        samples = UnpackRawInFloat32.from_stream(file_stream)(file_stream.read(file_stream.nframes))
+        n_blocks = file_stream.get_iterations()
+        hop_size = file_stream.hop_size or file_stream.blocksize
+        block_pitch = [
+            self._pitch_by_blocks(channel, file_stream.samplerate, file_stream.blocksize, hop_size, n_blocks)
+            for channel in samples.reshape(-1, file_stream.channels).T
+        ]
+        return block_pitch[0] if file_stream.channels == 1 else np.array(block_pitch)
+
+    def _pitch_by_blocks(self,
+                         samples: np.ndarray,
+                         samplerate: int,
+                         blocksize: int,
+                         hop_size: int,
+                         n_blocks: int) -> np.ndarray:
+        pitch = self._to_pitch(parselmouth.Sound(samples, samplerate))
+        pitch_values = pitch.selected_array['frequency']
+        voiced = pitch_values > 0
+        # Frames are sorted by time, so the frames of each block [start, start + blocksize)
+        # are a contiguous range and the sums over it are differences of cumulative sums
+        starts = np.arange(n_blocks) * hop_size
+        bounds = np.searchsorted(pitch.xs() * samplerate, np.stack((starts, starts + blocksize)))
+        cumulative_sums = np.concatenate(([0.0], np.cumsum(np.where(voiced, pitch_values, 0.0))))
+        cumulative_counts = np.concatenate(([0], np.cumsum(voiced)))
+        sums = cumulative_sums[bounds[1]] - cumulative_sums[bounds[0]]
+        counts = cumulative_counts[bounds[1]] - cumulative_counts[bounds[0]]
+        return np.divide(sums, counts, out=np.zeros(n_blocks), where=counts > 0)
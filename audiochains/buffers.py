@@ -0,0 +1,113 @@
+"""
+    Preallocated buffers used for passing raw audio blocks between threads.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Single producer single consumer ring buffer of raw audio blocks.
+    The storage is allocated once, the producer (PortAudio callback) only copies
+    the block into a free slot and never waits for the consumer. Each index is
+    changed by one side only, so no lock is required.
+    """
+
+    def __init__(self, block_bytes: int, capacity: int = 32):
+        self.block_bytes = block_bytes
+        self.capacity = capacity
+        self.storage = np.zeros((capacity, block_bytes), dtype=np.uint8)
+        self.lengths = np.zeros(capacity, dtype=np.int64)
+        self.overflows = 0
+        self.underflows = 0
+        self._write_index = 0
+        self._read_index = 0
+
+    def __len__(self) -> int:
+        return self._write_index - self._read_index
+
+    def is_empty(self) -> bool:
+        return self._write_index == self._read_index
+
+    def is_full(self) -> bool:
+        return self._write_index - self._read_index >= self.capacity
+
+    def put(self, in_data) -> bool:
+        """
+        Copies the block into the next free slot.
+        If the buffer is full the block is dropped and the overflow is counted.
+        """
+        if self.is_full():
+            self.overflows += 1
+            return False
+        data = np.frombuffer(in_data, dtype=np.uint8)
+        slot = self._write_index % self.capacity
+        self.storage[slot, :len(data)] = data
+        self.lengths[slot] = len(data)
+        self._write_index += 1
+        return True
+
+    def get(self) -> Optional[bytes]:
+        """
+        Returns the oldest block as bytes or None (counting the underflow)
+        if there is nothing to read.
+        """
+        if self.is_empty():
+            self.underflows += 1
+            return None
+        slot = self._read_index % self.capacity
+        data = self.storage[slot, :self.lengths[slot]].tobytes()
+        self._read_index += 1
+        return data
+
+    def get_into(self, out: np.ndarray) -> Optional[int]:
+        """
+        Copies the oldest block into the caller-owned uint8 array without any allocation
+        and returns its length in bytes or None (counting the underflow) if there is nothing to read.
+        """
+        if self.is_empty():
+            self.underflows += 1
+            return None
+        slot = self._read_index % self.capacity
+        length = self.lengths[slot]
+        out[:length] = self.storage[slot, :length]
+        self._read_index += 1
+        return length
+
+
+class SlidingWindow:
+    """
+    Sliding window over the raw audio stream for processing of overlapping blocks.
+    The storage has double length of the window and every incoming byte is written twice,
+    so the current window is always a contiguous view and the overlapping part is never copied again.
+    """
+
+    def __init__(self, window_bytes: int):
+        self.window_bytes = window_bytes
+        self.storage = np.zeros(2 * window_bytes, dtype=np.uint8)
+        self.filled = 0
+        self._position = 0
+
+    def is_empty(self) -> bool:
+        return self.filled == 0
+
+    def push(self, in_data) -> np.ndarray:
+        """
+        Appends the new data and returns the view over the latest window_bytes bytes.
+        The view is valid only until the next push.
+        """
+        data = np.frombuffer(in_data, dtype=np.uint8)[-self.window_bytes:]
+        size, start = len(data), self._position
+        head = min(size, self.window_bytes - start)
+        self.storage[start:start + head] = data[:head]
+        self.storage[start + self.window_bytes:start + self.window_bytes + head] = data[:head]
+        tail = size - head
+        if tail:
+            self.storage[:tail] = data[head:]
+            self.storage[self.window_bytes:self.window_bytes + tail] = data[head:]
+
+        self._position = (start + size) % self.window_bytes
+        self.filled = min(self.filled + size, self.window_bytes)
+        return self.storage[self._position:self._position + self.window_bytes]
@@ -1,11 +1,193 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Optional, Callable, Dict, Iterable, List
+
+from audiochains.profiling import ChainStats, nbytes_of
+
+
 class ChainOfMethods:
     """
     Implementation of Chain Of Command pattern for sequences of BlockAudioMethod.
+    A method can return None to stop the chain for this block (e.g. VoiceActivityDetector
+    on silence), then the rest of methods is skipped and the chain returns None.
     """
     def __init__(self, *chain):
         self.chain = chain
+        self.stats: Optional[ChainStats] = None
 
     def __call__(self, in_data):
+        if self.stats is not None:
+            return self._profiled_call(in_data)
         for block_method in self.chain:
             in_data = block_method(in_data)
+            if in_data is None:
+                return None
+        return in_data
+
+    def _profiled_call(self, in_data):
+        bytes_in = nbytes_of(in_data)
+        chain_start = perf_counter()
+        for block_method, method_stats in zip(self.chain, self.stats.methods):
+            method_start = perf_counter()
+            out_data = block_method(in_data)
+            method_stats.add(perf_counter() - method_start, nbytes_of(in_data), nbytes_of(out_data))
+            in_data = out_data
+            if in_data is None:
+                break
+        self.stats.block_done(perf_counter() - chain_start, bytes_in, nbytes_of(in_data))
         return in_data
+
+    def enable_profiling(self,
+                         blocksize: Optional[int] = None,
+                         samplerate: Optional[float] = None,
+                         window: int = 1000,
+                         hook: Optional[Callable[[ChainStats], None]] = None,
+                         hook_every: int = 100) -> ChainStats:
+        """
+        Starts collecting of per-method call counts, latencies and data sizes.
+        If blocksize and samplerate are passed, latencies are also reported relative
+        to the real-time budget (blocksize / samplerate). The hook is called with
+        the statistics every hook_every blocks.
+        """
+        budget = blocksize / samplerate if blocksize and samplerate else None
+        self.stats = ChainStats(self.chain, budget=budget, window=window, hook=hook, hook_every=hook_every)
+        return self.stats
+
+    def disable_profiling(self) -> None:
+        self.stats = None
+
+    def process_batch(self, in_data):
+        """
+        Passing a batch of blocks (n_blocks, ...) through the whole chain at once.
+        Each method uses its vectorized implementation if it has one,
+        otherwise it is applied to every block separately.
+        If a method returns None for some blocks (e.g. VoiceActivityDetector), the rest of the chain
+        is called block by block for the remaining blocks and the list of per-block results is returned,
+        with None for the stopped blocks.
+        """
+        for block_method in self.chain:
+            in_data = _process_batch(block_method, in_data)
+        return list(in_data) if isinstance(in_data, _GatedBlocks) else in_data
+
+    def reset(self):
+        """
+        Dropping the state which stateful methods carry between blocks,
+        for instance before processing of the next file.
+        """
+        for block_method in self.chain:
+            block_method.reset()
+
+
+class _GatedBlocks(list):
+    """
+    Per-block data of the batch after some blocks were stopped by None
+    """
+
+
+def _process_batch(block_method, in_data):
+    """
+    Passes the batch through the method. After gating, the blocks are passed one by one,
+    as batch results (e.g. FourierTuple) can't be split back into blocks in general.
+    """
+    if isinstance(in_data, _GatedBlocks):
+        return _GatedBlocks(None if block is None else block_method(block) for block in in_data)
+    out_data = block_method.process_batch(in_data)
+    if isinstance(out_data, list) and any(block is None for block in out_data):
+        return _GatedBlocks(out_data)
+    return out_data
+
+
+class _GraphNode:
+    def __init__(self, method=None, index: Optional[int] = None):
+        self.method = method
+        self.index = index
+        self.children: List['_GraphNode'] = list()
+        self.outputs: List[str] = list()
+
+
+class GraphOfMethods(ChainOfMethods):
+    """
+    A processing graph built from several named chains of BlockAudioMethod instances.
+    Chains starting with the same method instances share this prefix, so it is computed
+    once per block, and the call returns the dict of named outputs.
+    With workers > 0 the independent branches are run concurrently on a thread pool,
+    which pays off for methods releasing the GIL (numpy FFT, scipy filters).
+
+    Example
+    ------
+        unpack = UnpackRawInFloat32()
+        graph = GraphOfMethods({
+            'rms': (unpack, RMSFromArray()),
+            'spectrum': (unpack, HammingWindow(), FourierTransform(framerate=16000)),
+        })
+    """
+    def __init__(self, outputs: Dict[str, Iterable], workers: int = 0):
+        self.root = _GraphNode()
+        self.names = list(outputs)
+        methods = list()
+        for name, branch in outputs.items():
+            if isinstance(branch, ChainOfMethods):
+                branch = branch.chain
+            node = self.root
+            for method in branch:
+                child = next((child for child in node.children if child.method is method), None)
+                if child is None:
+                    if not any(method is known for known in methods):
+                        methods.append(method)
+                    child = _GraphNode(method, next(i for i, known in enumerate(methods) if known is method))
+                    node.children.append(child)
+                node = child
+            node.outputs.append(name)
+        super().__init__(*methods)
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers else None
+
+    def __call__(self, in_data) -> dict:
+        if self.stats is None:
+            return self._run(in_data, self._call_node)
+        bytes_in = nbytes_of(in_data)
+        start = perf_counter()
+        results = self._run(in_data, self._call_node)
+        self.stats.block_done(perf_counter() - start, bytes_in, sum(nbytes_of(out) for out in results.values()))
+        return results
+
+    def process_batch(self, in_data) -> dict:
+        """
+        Passing a batch of blocks through the graph, the branches are gated as in ChainOfMethods.process_batch
+        """
+        results = self._run(in_data, lambda node, data: _process_batch(node.method, data))
+        return {name: list(out) if isinstance(out, _GatedBlocks) else out for name, out in results.items()}
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _call_node(self, node: _GraphNode, in_data):
+        if self.stats is None:
+            return node.method(in_data)
+        start = perf_counter()
+        out_data = node.method(in_data)
+        self.stats.methods[node.index].add(perf_counter() - start, nbytes_of(in_data), nbytes_of(out_data))
+        return out_data
+
+    def _run(self, in_data, call: Callable) -> dict:
+        """
+        Runs the graph level by level, the nodes of one level are independent of each other.
+        The branch is stopped when its method returns None, its outputs are None then.
+        """
+        results = dict.fromkeys(self.names)
+        results.update((name, in_data) for name in self.root.outputs)
+        level = [(child, in_data) for child in self.root.children]
+        while level:
+            if self.executor is not None and len(level) > 1:
+                outputs = list(self.executor.map(lambda item: call(*item), level))
+            else:
+                outputs = [call(node, data) for node, data in level]
+
+            next_level = list()
+            for (node, _), out_data in zip(level, outputs):
+                for name in node.outputs:
+                    results[name] = out_data
+                if out_data is not None:
+                    next_level.extend((child, out_data) for child in node.children)
+            level = next_level
+        return results
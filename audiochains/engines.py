@@ -0,0 +1,81 @@
+"""
+    Parallel processing of many WAV files by the same ChainOfMethods in a pool of processes.
+"""
+
+import os
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Iterable, Optional, Tuple
+
+from audiochains.chains import ChainOfMethods
+from audiochains.streams import StreamFromFile
+
+_worker_chain: Optional[ChainOfMethods] = None
+
+
+def _init_worker(chain_of_methods: ChainOfMethods) -> None:
+    """
+    The chain is pickled once per worker process and reused by all its tasks
+    """
+    global _worker_chain
+    _worker_chain = chain_of_methods
+
+
+def _process_blocks(task: Tuple[str, int, int, Optional[int]]) -> list:
+    filename, blocksize, start_block, n_blocks = task
+    _worker_chain.reset()
+    file_stream = StreamFromFile(filename=filename, blocksize=blocksize, chain_of_methods=_worker_chain)
+    file_stream.open()
+    try:
+        if n_blocks is None:
+            n_blocks = file_stream.get_iterations() - start_block
+        file_stream.seek(start_block)
+        return [file_stream.apply() for _ in range(n_blocks)]
+    finally:
+        file_stream.close()
+
+
+def _split_file(filename: str, blocksize: int, blocks_per_task: Optional[int]) -> List[Tuple[str, int, int, Optional[int]]]:
+    if blocks_per_task is None:
+        return [(filename, blocksize, 0, None)]
+    with wave.open(filename, 'rb') as wav_file:
+        frames = wav_file.getnframes()
+    n_blocks = -(-frames // blocksize)
+    return [
+        (filename, blocksize, start_block, min(blocks_per_task, n_blocks - start_block))
+        for start_block in range(0, n_blocks, blocks_per_task)
+    ] or [(filename, blocksize, 0, 0)]
+
+
+def process_files(paths: Iterable[str],
+                  chain_of_methods: ChainOfMethods,
+                  workers: Optional[int] = None,
+                  blocksize: int = 1024,
+                  blocks_per_task: Optional[int] = None) -> List[list]:
+    """
+    Applies the chain to every block of each file using a pool of worker processes
+    and returns the lists of per-block results in the order of passed paths.
+
+    Parameters
+    ----------
+    paths: WAV file names
+    chain_of_methods: an instance of the ChainOfMethods class, it must be picklable
+    workers: the number of processes, os.cpu_count() by default
+    blocksize: the amount of frames in one block
+    blocks_per_task: if passed, large files are split into ranges of this amount of blocks
+        processed independently, so the state of stateful methods is reset at the range boundaries
+    """
+    paths = list(paths)
+    tasks, owners = list(), list()
+    for index, path in enumerate(paths):
+        file_tasks = _split_file(path, blocksize, blocks_per_task)
+        tasks.extend(file_tasks)
+        owners.extend([index] * len(file_tasks))
+
+    results = [list() for _ in paths]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                             initializer=_init_worker,
+                             initargs=(chain_of_methods,)) as executor:
+        for index, blocks in zip(owners, executor.map(_process_blocks, tasks)):
+            results[index].extend(blocks)
+    return results
@@ -24,3 +24,24 @@ class AppException:
             WAV file cannot be opened, closed or does not exist.
             """
             AppExceptionCase.__init__(self, description)
+
+    class StreamException(AppExceptionCase):
+        def __init__(self, description: str = None):
+            """
+            Stream cannot be configured with the passed parameters.
+            """
+            AppExceptionCase.__init__(self, description)
+
+    class BlockAudioMethodException(AppExceptionCase):
+        def __init__(self, description: str = None):
+            """
+            BlockAudioMethod cannot be configured with the passed parameters.
+            """
+            AppExceptionCase.__init__(self, description)
+
+    class WriterException(AppExceptionCase):
+        def __init__(self, description: str = None):
+            """
+            Data cannot be written in the file with its current layout.
+            """
+            AppExceptionCase.__init__(self, description)
@@ -16,6 +16,12 @@ class FourierTuple:
     frequency: np.ndarray
 
 
+@dataclass
+class PitchTuple:
+    frequency: np.ndarray
+    confidence: np.ndarray
+
+
 class VoiceRange(IntEnum):
     SILENCE = 0
     WHISPER = 1
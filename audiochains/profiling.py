@@ -0,0 +1,118 @@
+"""
+    Collecting latency statistics of BlockAudioMethod calls inside the ChainOfMethods.
+"""
+
+from dataclasses import fields, is_dataclass
+from typing import Optional, Callable, List
+
+import numpy as np
+
+
+def nbytes_of(data) -> int:
+    if data is None:
+        return 0
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, memoryview):
+        return data.nbytes
+    if is_dataclass(data):
+        return sum(nbytes_of(getattr(data, field.name)) for field in fields(data))
+    try:
+        return np.asarray(data).nbytes
+    except (TypeError, ValueError):
+        return 0
+
+
+class LatencyStats:
+    """
+    Call counter with the cumulative time and the window of the latest latencies for percentiles
+    """
+
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self.calls = 0
+        self.total_time = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latencies = np.zeros(window, dtype=np.float64)
+
+    def add(self, elapsed: float, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        self.latencies[self.calls % len(self.latencies)] = elapsed
+        self.calls += 1
+        self.total_time += elapsed
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def percentiles(self, *q: float) -> np.ndarray:
+        latest = self.latencies[:min(self.calls, len(self.latencies))]
+        if not len(latest):
+            return np.zeros(len(q))
+        return np.percentile(latest, q)
+
+    def summary(self, budget: Optional[float] = None) -> dict:
+        p50, p95, p99 = self.percentiles(50, 95, 99)
+        summary = {
+            'name': self.name,
+            'calls': self.calls,
+            'total_time': self.total_time,
+            'mean': self.total_time / self.calls if self.calls else 0.0,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+        }
+        if budget:
+            summary.update({
+                'p50_budget': p50 / budget,
+                'p95_budget': p95 / budget,
+                'p99_budget': p99 / budget,
+            })
+        return summary
+
+
+class ChainStats:
+    """
+    Statistics of the whole chain and each of its methods.
+    Latencies are reported both in seconds and relative to the real-time budget
+    (the duration of one block) if it is known.
+    """
+
+    def __init__(self,
+                 chain,
+                 budget: Optional[float] = None,
+                 window: int = 1000,
+                 hook: Optional[Callable[['ChainStats'], None]] = None,
+                 hook_every: int = 100):
+        self.budget = budget
+        self.hook = hook
+        self.hook_every = hook_every
+        self.total = LatencyStats('chain', window)
+        self.methods: List[LatencyStats] = [
+            LatencyStats(f'{index}:{method.__class__.__name__}', window) for index, method in enumerate(chain)
+        ]
+
+    def block_done(self, elapsed: float, bytes_in: int, bytes_out: int) -> None:
+        self.total.add(elapsed, bytes_in, bytes_out)
+        if self.hook is not None and self.total.calls % self.hook_every == 0:
+            self.hook(self)
+
+    @property
+    def overruns(self) -> int:
+        """
+        The amount of the latest blocks which were processed longer than the budget
+        """
+        if not self.budget:
+            return 0
+        latest = self.total.latencies[:min(self.total.calls, len(self.total.latencies))]
+        return int(np.count_nonzero(latest > self.budget))
+
+    def report(self) -> dict:
+        return {
+            'budget': self.budget,
+            'overruns': self.overruns,
+            'chain': self.total.summary(self.budget),
+            'methods': [method.summary(self.budget) for method in self.methods],
+        }
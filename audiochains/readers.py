@@ -0,0 +1,165 @@
+"""
+    Readers giving the direct access to audio data stored in files.
+"""
+
+import glob
+import mmap
+import struct
+from collections import defaultdict
+from typing import Optional, Dict
+
+import numpy as np
+
+from audiochains.exceptions import AppException
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def wav_sample_format(sampwidth: int, format_tag: int = WAVE_FORMAT_PCM) -> str:
+    """
+    Returns the sample format name (as sounddevice dtype) of WAV samples: 8-bit PCM is unsigned,
+    32-bit samples are integer for PCM and float for IEEE float format
+    """
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        if sampwidth != 4:
+            raise AppException.WAVFileException(f'unsupported float samples of {sampwidth * 8} bits')
+        return 'float32'
+    if sampwidth not in (1, 2, 3, 4):
+        raise AppException.WAVFileException(f'unsupported sample width: {sampwidth}')
+    return {1: 'uint8', 2: 'int16', 3: 'int24', 4: 'int32'}[sampwidth]
+
+
+class MappedWAV:
+    """
+    This class maps the WAV file into memory and exposes its PCM data region as numpy arrays,
+    so blocks are taken as views without reading and copying, in any order.
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.framerate = None
+        self.channels = None
+        self.sampwidth = None
+        self.format_tag = None
+        self.nframes = None
+        self.raw = None
+        self._file = None
+        self._mmap = None
+        self.open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self) -> None:
+        self._file = open(self.file_name, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise AppException.WAVFileException(f'{self.file_name} is empty')
+        data_offset, data_size = self._parse_chunks()
+        frame_bytes = self.channels * self.sampwidth
+        self.nframes = data_size // frame_bytes
+        self.raw = np.frombuffer(self._mmap, dtype=np.uint8, count=self.nframes * frame_bytes,
+                                 offset=data_offset).reshape(self.nframes, frame_bytes)
+
+    def close(self) -> None:
+        """
+        The mapping stays alive while there are views over it taken by the caller.
+        """
+        self.raw = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _parse_chunks(self):
+        if len(self._mmap) < 12 or self._mmap[:4] != b'RIFF' or self._mmap[8:12] != b'WAVE':
+            raise AppException.WAVFileException(f'{self.file_name} is not a RIFF WAVE file')
+
+        data_offset, data_size, offset = None, None, 12
+        while offset + 8 <= len(self._mmap):
+            chunk_id, chunk_size = struct.unpack_from('<4sI', self._mmap, offset)
+            body = offset + 8
+            if chunk_id == b'fmt ':
+                self.format_tag, self.channels, self.framerate, _, _, bits = struct.unpack_from(
+                    '<HHIIHH', self._mmap, body)
+                if self.format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                    self.format_tag, = struct.unpack_from('<H', self._mmap, body + 24)
+                self.sampwidth = bits // 8
+            elif chunk_id == b'data':
+                data_offset = body
+                data_size = min(chunk_size, len(self._mmap) - body)
+                break
+            offset = body + chunk_size + chunk_size % 2
+
+        if self.sampwidth is None or data_offset is None:
+            raise AppException.WAVFileException(f'{self.file_name} has no fmt or data chunk')
+        return data_offset, data_size
+
+    @property
+    def sample_format(self) -> str:
+        return wav_sample_format(self.sampwidth, self.format_tag)
+
+    @property
+    def samples(self) -> np.ndarray:
+        """
+        The view of shape (nframes, channels) over the whole data region with the sample type of the file.
+        24-bit samples have no numpy type, use raw array for them.
+        """
+        if self.sampwidth == 4 and self.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            dtype = np.float32
+        else:
+            dtype = {1: np.uint8, 2: np.int16, 4: np.int32}.get(self.sampwidth)
+        if dtype is None:
+            raise AppException.WAVFileException(f'{self.sampwidth * 8}-bit samples can be accessed as raw bytes only')
+        return self.raw.view(dtype)
+
+    def frames(self, start: int, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Returns the flat uint8 view over raw frames in range [start, stop)
+        """
+        return self.raw[start:stop].reshape(-1)
+
+    def block(self, block_index: int, blocksize: int) -> np.ndarray:
+        """
+        Returns the flat uint8 view over the block with the passed index
+        """
+        return self.frames(block_index * blocksize, (block_index + 1) * blocksize)
+
+    def time_slice(self, start_seconds: float, end_seconds: Optional[float] = None) -> np.ndarray:
+        """
+        Returns the view of samples array between two moments of time
+        """
+        start = int(start_seconds * self.framerate)
+        stop = None if end_seconds is None else int(end_seconds * self.framerate)
+        return self.samples[start:stop]
+
+
+def read_features(file_name: str, mmap_mode: Optional[str] = 'r') -> Dict[str, np.ndarray]:
+    """
+    Reads columns written by WriterInNPY (memory-mapped by default) or WriterInNPZ
+    """
+    if file_name.endswith('.npz'):
+        chunks = defaultdict(list)
+        with np.load(file_name) as archive:
+            for member_name in sorted(archive.files):
+                chunks[member_name.rsplit('.', 1)[0]].append(archive[member_name])
+        return {name: np.concatenate(column) for name, column in chunks.items()}
+
+    if file_name.endswith('.npy'):
+        file_name = file_name[:-len('.npy')]
+    columns = dict()
+    for path in sorted(glob.glob(glob.escape(file_name) + '.*.npy')):
+        columns[path[len(file_name) + 1:-len('.npy')]] = np.load(path, mmap_mode=mmap_mode)
+    return columns
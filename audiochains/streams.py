@@ -1,12 +1,19 @@
+import asyncio
 import json
 import wave
-from typing import Union, Optional
+import time
+from concurrent.futures import Executor
+from typing import Union, Optional, AsyncIterator
 from abc import ABC, abstractmethod
 
+import numpy as np
 import sounddevice as sd
 from jsonschema import validate
 
+from audiochains.buffers import RingBuffer, SlidingWindow
 from audiochains.chains import ChainOfMethods
+from audiochains.exceptions import AppException
+from audiochains.readers import MappedWAV, wav_sample_format
 from audiochains.schemas import stream_parameters_schema
 
 two_sided_sampwidth = {
@@ -29,10 +36,13 @@ class StreamWithChain(ABC):
        An interface which defines a wrapping for sounddevice stream objects.
        This class should store the ChainOfMethods instance and define applying
        this chain to raw input data.
+       If hop_size is set, the chain gets overlapping blocks shifted by hop_size frames.
     """
 
-    def __init__(self, chain_of_methods: Optional[ChainOfMethods]):
+    def __init__(self, chain_of_methods: Optional[ChainOfMethods], hop_size: Optional[int] = None):
         self.chain_of_methods = chain_of_methods
+        self.hop_size = hop_size
+        self.sliding_window = None
 
     @staticmethod
     def from_json(json_file: str, schema: dict):
@@ -61,6 +71,41 @@ class StreamWithChain(ABC):
         """
         self.chain_of_methods = ChainOfMethods(*args)
 
+    async def _apply_async(self, in_data, in_executor: bool, executor: Optional[Executor]):
+        """
+        Runs the chain in the event loop thread or, with in_executor, in the executor (the default one if None)
+        """
+        if not in_executor:
+            return self.chain_of_methods(in_data)
+        return await asyncio.get_running_loop().run_in_executor(executor, self.chain_of_methods, in_data)
+
+    def _init_sliding_window(self, frame_bytes: int) -> None:
+        if self.hop_size is None:
+            return
+        if not 0 < self.hop_size <= self.blocksize:
+            raise AppException.StreamException('hop_size should be in range (0, blocksize]')
+        self.sliding_window = SlidingWindow(window_bytes=self.blocksize * frame_bytes)
+
+    def read_window(self) -> Optional[np.ndarray]:
+        """
+        Reads hop_size new frames (the whole block at first call) and returns
+        the view over the latest blocksize frames, which is valid until the next call.
+        Returns None when there are no new frames (the end of file).
+        """
+        frames = self.blocksize if self.sliding_window.is_empty() else self.hop_size
+        in_data = self.read(frames)
+        if in_data is None or not len(in_data):
+            return None
+        return self.sliding_window.push(in_data)
+
+    def read_block(self):
+        """
+        Reads the next block passed to the chain: disjoint or overlapping if hop_size is set
+        """
+        if self.sliding_window is not None:
+            return self.read_window()
+        return self.read(self.blocksize)
+
     @abstractmethod
     def apply(self):
         """
@@ -70,12 +115,210 @@ class StreamWithChain(ABC):
         ...
 
 
-class IOStream(StreamWithChain, sd.RawStream):
+class DeviceStreamWithChain(StreamWithChain):
+    """
+    A common part of sounddevice based StreamWithChain implementations.
+    Raw blocks are read either by blocking calls or, in callback mode,
+    from the ring buffer which is filled by the PortAudio callback.
+    In zero copy mode read returns numpy uint8 view over the buffer which is reused for every block.
+    """
+
+    def __init__(self,
+                 chain_of_methods: Optional[ChainOfMethods],
+                 ring_buffer_blocks: Optional[int] = None,
+                 zero_copy: bool = False,
+                 hop_size: Optional[int] = None):
+        StreamWithChain.__init__(self, chain_of_methods, hop_size)
+        self.ring_buffer = None
+        self.input_overflows = 0
+        self.async_drops = 0
+        self._async_sink = None
+        self.zero_copy = zero_copy
+        # The PortAudio stream is already opened by the sounddevice constructor, so it is closed on rejection
+        if (ring_buffer_blocks or zero_copy or hop_size) and not self.blocksize:
+            self.close()
+            raise AppException.StreamException('callback, zero copy and overlapping modes require the fixed blocksize')
+        if ring_buffer_blocks and hop_size:
+            self.close()
+            raise AppException.StreamException('overlapping blocks are not supported in callback mode')
+
+        self._init_sliding_window(self._input_frame_bytes())
+        block_bytes = self.blocksize * self._input_frame_bytes()
+        if ring_buffer_blocks:
+            self.ring_buffer = RingBuffer(block_bytes=block_bytes, capacity=ring_buffer_blocks)
+        if zero_copy:
+            self._read_buffer = np.empty(block_bytes, dtype=np.uint8)
+            self._read_cdata = None
+            # Blocking reads go straight into the buffer through the cffi internals of sounddevice,
+            # if they are missing in the installed version, the public read is copied into it
+            if all(hasattr(sd, name) for name in ('_ffi', '_lib', '_check')) and hasattr(self, '_ptr'):
+                self._read_cdata = sd._ffi.from_buffer(self._read_buffer)
+
+    def _input_frame_bytes(self) -> int:
+        channels, samplesize = self.channels, self.samplesize
+        if isinstance(channels, tuple):
+            channels, samplesize = channels[0], samplesize[0]
+        return channels * samplesize
+
+    def _store_block(self, in_data, status) -> None:
+        """
+        The only work done inside the PortAudio callback: copying the block into the ring buffer
+        """
+        if status.input_overflow:
+            self.input_overflows += 1
+        sink = self._async_sink
+        if sink is not None:
+            sink(in_data)
+        else:
+            self.ring_buffer.put(in_data)
+
+    @property
+    def overflows(self) -> int:
+        """
+        The amount of blocks lost because the PortAudio, the ring buffer or the asyncio queue was overflowed
+        """
+        ring_overflows = self.ring_buffer.overflows if self.ring_buffer is not None else 0
+        return self.input_overflows + ring_overflows + self.async_drops
+
+    @property
+    def underflows(self) -> int:
+        """
+        The amount of times the chain was waiting for the next block from the ring buffer
+        """
+        return self.ring_buffer.underflows if self.ring_buffer is not None else 0
+
+    def get_iterations(self, seconds: int) -> Union[int, float]:
+        """
+        Return the amount of iteration which is mapped to passed amount of second
+        :param seconds:
+        :return:
+        """
+        if seconds:
+            return int((self.samplerate / (self.hop_size or self.blocksize)) * seconds)
+        else:
+            return float('inf')
+
+    def read(self, frames):
+        """
+        Overridden base class method where cffi buffer object
+        is unpacked to bytes. In callback mode the next block is taken from the ring buffer.
+        In zero copy mode the returned numpy view is valid only until the next read.
+        """
+        if self.ring_buffer is not None:
+            return self._read_from_ring_buffer()
+        if self.zero_copy and frames <= self.blocksize:
+            return self._read_into_buffer(frames)
+        return memoryview(sd.RawInputStream.read(self, frames=frames)[0]).tobytes()
+
+    def _read_into_buffer(self, frames: int) -> np.ndarray:
+        """
+        Blocking read into the preallocated buffer
+        """
+        n_bytes = frames * self._input_frame_bytes()
+        if self._read_cdata is None:
+            in_data, overflowed = sd.RawInputStream.read(self, frames=frames)
+            self.input_overflows += bool(overflowed)
+            self._read_buffer[:n_bytes] = np.frombuffer(in_data, dtype=np.uint8)
+        else:
+            error = sd._lib.Pa_ReadStream(self._ptr, self._read_cdata, frames)
+            if error == sd._lib.paInputOverflowed:
+                self.input_overflows += 1
+            else:
+                sd._check(error)
+        if frames == self.blocksize:
+            return self._read_buffer
+        return self._read_buffer[:n_bytes]
+
+    def _get_from_ring_buffer(self):
+        if not self.zero_copy:
+            return self.ring_buffer.get()
+        length = self.ring_buffer.get_into(self._read_buffer)
+        if length is None:
+            return None
+        return self._read_buffer if length == len(self._read_buffer) else self._read_buffer[:length]
+
+    def _read_from_ring_buffer(self) -> Optional[Union[bytes, np.ndarray]]:
+        in_data = self._get_from_ring_buffer()
+        poll_interval = self.blocksize / self.samplerate / 4
+        while in_data is None and self.active:
+            time.sleep(poll_interval)
+            if not self.ring_buffer.is_empty():
+                in_data = self._get_from_ring_buffer()
+        return in_data
+
+    def apply(self):
+        """
+        Calling the ChainOfMethods attributes which processes the raw audio data
+        :return:
+        """
+        in_data = self.read_block()
+        if in_data is None:
+            return None
+        return self.chain_of_methods(in_data)
+
+    async def aiter_apply(self,
+                          seconds: Optional[float] = None,
+                          max_pending: int = 32,
+                          policy: str = 'drop_oldest',
+                          in_executor: bool = False,
+                          executor: Optional[Executor] = None) -> AsyncIterator:
+        """
+        Asynchronous iteration over processed blocks, available in callback mode.
+        While iterating, the PortAudio callback passes copies of blocks to the asyncio.Queue
+        of the running loop by call_soon_threadsafe instead of the ring buffer.
+        If more than max_pending blocks are waiting, the oldest or the newest one is dropped
+        according to the policy and counted in async_drops.
+
+        Example
+        ------
+            with InputStream(json_file='test_config.json', ring_buffer_blocks=16) as stream:
+                async for rms in stream.aiter_apply(seconds=10):
+                    await websocket.send(str(rms))
+        """
+        if self.ring_buffer is None:
+            raise AppException.StreamException('asynchronous iteration requires callback mode (ring_buffer_blocks)')
+        if policy not in ('drop_oldest', 'drop_newest'):
+            raise AppException.StreamException(f'unknown backpressure policy: {policy}')
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=max_pending)
+
+        def enqueue(in_data: bytes) -> None:
+            if queue.full():
+                self.async_drops += 1
+                if policy == 'drop_newest':
+                    return
+                queue.get_nowait()
+            queue.put_nowait(in_data)
+
+        # The blocks stored before the sink is attached are older than those coming through the loop
+        self._async_sink = lambda in_data: loop.call_soon_threadsafe(enqueue, bytes(in_data))
+        while not self.ring_buffer.is_empty():
+            enqueue(self.ring_buffer.get())
+
+        timeout = 4 * self.blocksize / self.samplerate
+        iterations, iteration = self.get_iterations(seconds), 0
+        try:
+            while iteration < iterations:
+                try:
+                    in_data = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if self.active:
+                        continue
+                    break
+                yield await self._apply_async(in_data, in_executor, executor)
+                iteration += 1
+        finally:
+            self._async_sink = None
+
+
+class IOStream(DeviceStreamWithChain, sd.RawStream):
     """
     An overridden sd.RawStream class as a StreamWithChain interface implementation
     """
 
     def __init__(self, json_file: str = None, sampwidth=2, chain_of_methods: ChainOfMethods = None, *args,
+                 ring_buffer_blocks: Optional[int] = None, zero_copy: bool = False, hop_size: Optional[int] = None,
                  **kwargs):
         """
          This class can be initialized by passing the json file name with necessary parameters.
@@ -96,45 +339,32 @@ class IOStream(StreamWithChain, sd.RawStream):
         ----------
         json_file: a json file name containing necessary parameters
         chain_of_methods: an instance of the ChainOfMethods class
+        ring_buffer_blocks: if passed, the stream works in callback mode and
+            PortAudio callback stores up to this amount of blocks in the ring buffer
+        zero_copy: if True, read returns numpy uint8 view over the reused buffer instead of new bytes
+        hop_size: if passed, apply processes overlapping blocks shifted by this amount of frames
         *args, **kwargs: parameters for base sd.RawStream class
         """
+        if ring_buffer_blocks:
+            kwargs['callback'] = self._callback
 
         if json_file:
             sd.RawStream.__init__(self, *args, **self.from_json(json_file=json_file, schema=stream_parameters_schema),
                                   **kwargs)
         else:
             sd.RawStream.__init__(self, *args, dtype=two_sided_sampwidth[sampwidth], **kwargs)
-        StreamWithChain.__init__(self, chain_of_methods)
-
-    def get_iterations(self, seconds: int) -> Union[int, float]:
-        """
-        Return the amount of iteration which is mapped to passed amount of second
-        :param seconds:
-        :return:
-        """
-        if seconds:
-            return int((self.samplerate / self.blocksize) * seconds)
-        else:
-            return float('inf')
+        DeviceStreamWithChain.__init__(self, chain_of_methods, ring_buffer_blocks, zero_copy, hop_size)
+        self._silence = memoryview(bytes(self.blocksize * self.channels[1] * self.samplesize[1]))
 
-    def read(self, frames):
-        """
-        Overridden base class method where cffi buffer object
-        is unpacked to bytes
-        """
-        return memoryview(sd.RawStream.read(self, frames=frames)[0]).tobytes()
-
-    def apply(self):
-        """
-        Calling the ChainOfMethods attributes which processes the raw audio data
-        :return:
-        """
-        in_data = self.read(self.blocksize)
-        return self.chain_of_methods(in_data)
+    def _callback(self, in_data, out_data, frames, time_info, status):
+        self._store_block(in_data, status)
+        out_data[:] = self._silence[:len(out_data)]
 
 
-class InputStream(StreamWithChain, sd.RawInputStream):
-    def __init__(self, json_file: str = None, sampwidth=2, chain_of_methods: ChainOfMethods = None, *args, **kwargs):
+class InputStream(DeviceStreamWithChain, sd.RawInputStream):
+    def __init__(self, json_file: str = None, sampwidth=2, chain_of_methods: ChainOfMethods = None, *args,
+                 ring_buffer_blocks: Optional[int] = None, zero_copy: bool = False, hop_size: Optional[int] = None,
+                 **kwargs):
         """
          This class can be initialized by passing the json file name with necessary parameters.
 
@@ -154,57 +384,49 @@ class InputStream(StreamWithChain, sd.RawInputStream):
         ----------
         json_file: a json file name containing necessary parameters
         chain_of_methods: an instance of the ChainOfMethods class
+        ring_buffer_blocks: if passed, the stream works in callback mode and
+            PortAudio callback stores up to this amount of blocks in the ring buffer
+        zero_copy: if True, read returns numpy uint8 view over the reused buffer instead of new bytes
+        hop_size: if passed, apply processes overlapping blocks shifted by this amount of frames
         *args, **kwargs: parameters for base sd.RawStream class
         """
+        if ring_buffer_blocks:
+            kwargs['callback'] = self._callback
 
         if json_file:
             sd.RawInputStream.__init__(self, *args, **self.from_json(json_file, stream_parameters_schema), **kwargs)
         else:
             sd.RawInputStream.__init__(self, *args, dtype=one_sided_sampwidth[sampwidth], **kwargs)
-        StreamWithChain.__init__(self, chain_of_methods)
+        DeviceStreamWithChain.__init__(self, chain_of_methods, ring_buffer_blocks, zero_copy, hop_size)
 
-    def get_iterations(self, seconds: int) -> Union[int, float]:
-        """
-        Return the amount of iteration which is mapped to passed amount of second
-        :param seconds:
-        :return:
-        """
-        if seconds:
-            return int((self.samplerate / self.blocksize) * seconds)
-        else:
-            return float('inf')
-
-    def read(self, frames):
-        """
-        Overridden base class method where cffi buffer object
-        is unpacked to bytes
-        """
-        return memoryview(sd.RawStream.read(self, frames=frames)[0]).tobytes()
-
-    def apply(self):
-        """
-        Calling the ChainOfMethods attributes which processes the raw audio data
-        :return:
-        """
-        in_data = self.read(self.blocksize)
-        return self.chain_of_methods(in_data)
+    def _callback(self, in_data, frames, time_info, status):
+        self._store_block(in_data, status)
 
 
 class StreamFromFile(StreamWithChain):
     """
     A realization of StreamWithChain interface
-    which playbacks WAV file by block(chunk) of frames for the sake of testing
+    which playbacks WAV file by block(chunk) of frames for the sake of testing.
+    With use_mmap the file is memory-mapped and read returns numpy uint8 views
+    over the file data instead of copied bytes, and seeking costs nothing.
     """
 
     def __init__(self,
                  filename: str,
                  blocksize: int = 1024,
-                 chain_of_methods: Optional[ChainOfMethods] = None):
-        super().__init__(chain_of_methods)
+                 chain_of_methods: Optional[ChainOfMethods] = None,
+                 hop_size: Optional[int] = None,
+                 use_mmap: bool = False):
+        super().__init__(chain_of_methods, hop_size)
         self.blocksize = blocksize
         self.filename = filename
         self.iterations = None
+        self.use_mmap = use_mmap
         self.wav_file = None
+        self.mapped_file = None
+        self.nframes = None
+        self.sample_format = None
+        self._position = 0
 
     def __enter__(self):
         self.open()
@@ -215,21 +437,158 @@ class StreamFromFile(StreamWithChain):
         return True
 
     def open(self) -> None:
-        self.wav_file = wave.open(self.filename, 'rb')
-        parameters = self.wav_file.getparams()
-        self.samplerate, self.channels = parameters.framerate, parameters.nchannels
+        if self.use_mmap:
+            self.mapped_file = MappedWAV(self.filename)
+            self.samplerate, self.channels = self.mapped_file.framerate, self.mapped_file.channels
+            self.sampwidth, self.nframes = self.mapped_file.sampwidth, self.mapped_file.nframes
+            self.sample_format = self.mapped_file.sample_format
+        else:
+            self.wav_file = wave.open(self.filename, 'rb')
+            parameters = self.wav_file.getparams()
+            self.samplerate, self.channels = parameters.framerate, parameters.nchannels
+            self.sampwidth, self.nframes = parameters.sampwidth, parameters.nframes
+            # wave module reads integer PCM only
+            self.sample_format = wav_sample_format(self.sampwidth)
+        self._position = 0
+        self._init_sliding_window(self.sampwidth * self.channels)
 
     def close(self) -> None:
-        self.wav_file.close()
+        if self.mapped_file is not None:
+            self.mapped_file.close()
+        else:
+            self.wav_file.close()
 
     def read(self, frames):
+        if self.mapped_file is not None:
+            in_data = self.mapped_file.frames(self._position, self._position + frames)
+            self._position = min(self._position + frames, self.nframes)
+            return in_data
         return self.wav_file.readframes(frames)
 
+    def seek(self, block_index: int) -> None:
+        """
+        Moves the reading position to the beginning of the block with the passed index
+        """
+        self.seek_frame(block_index * self.blocksize)
+
+    def seek_time(self, seconds: float) -> None:
+        """
+        Moves the reading position to the passed moment of time
+        """
+        self.seek_frame(int(seconds * self.samplerate))
+
+    def seek_frame(self, frame: int) -> None:
+        frame = min(frame, self.nframes)
+        if self.mapped_file is not None:
+            self._position = frame
+        else:
+            self.wav_file.setpos(frame)
+        if self.sliding_window is not None:
+            self.sliding_window = SlidingWindow(window_bytes=self.sliding_window.window_bytes)
+
+    def read_time_range(self, start_seconds: float, end_seconds: float):
+        """
+        Reads raw frames between two moments of time
+        """
+        self.seek_time(start_seconds)
+        return self.read(int(end_seconds * self.samplerate) - int(start_seconds * self.samplerate))
+
+    def read_batch(self, n_blocks: int) -> np.ndarray:
+        """
+        Reads up to n_blocks blocks at once and returns them as 2-D uint8 array
+        of shape (n_blocks, blocksize * sampwidth * channels).
+        The last incomplete block is padded with zeros, apply_batch leaves it for apply instead.
+        Overlapping blocks are not supported here.
+        """
+        batch = self._read_full_blocks(n_blocks)
+        if len(batch) == n_blocks:
+            return batch
+        tail = self.read(self.blocksize)
+        if not len(tail):
+            return batch
+        padded = np.zeros((len(batch) + 1, batch.shape[1]), dtype=np.uint8)
+        padded[:-1] = batch
+        padded[-1, :len(tail)] = np.frombuffer(tail, dtype=np.uint8)
+        return padded
+
+    def _read_full_blocks(self, n_blocks: int) -> np.ndarray:
+        """
+        Reads up to n_blocks complete blocks, the last incomplete block of the file stays unread
+        """
+        if self.hop_size is not None:
+            raise AppException.StreamException('batch reading of overlapping blocks is not supported')
+        block_bytes = self.blocksize * self.sampwidth * self.channels
+        position = self._position if self.mapped_file is not None else self.wav_file.tell()
+        n_full = max(min(n_blocks, (self.nframes - position) // self.blocksize), 0)
+        raw_data = self.read(self.blocksize * n_full)
+        return np.frombuffer(raw_data, dtype=np.uint8).reshape(n_full, block_bytes)
+
     def apply(self):
-        return self.chain_of_methods(in_data=self.read(self.blocksize))
+        in_data = self.read_block()
+        if in_data is None:
+            return None
+        return self.chain_of_methods(in_data=in_data)
+
+    async def aiter_apply(self,
+                          seconds: Optional[float] = None,
+                          max_pending: int = 4,
+                          in_executor: bool = False,
+                          executor: Optional[Executor] = None) -> AsyncIterator:
+        """
+        Asynchronous iteration over processed blocks of the file.
+        Blocks are read ahead by a separate task into the queue of max_pending blocks,
+        the reader waits while the queue is full, so no block is dropped.
+        """
+        queue = asyncio.Queue(maxsize=max_pending)
+
+        async def produce() -> None:
+            try:
+                for _ in range(self.get_iterations(seconds)):
+                    in_data = self.read_block()
+                    if in_data is None:
+                        break
+                    if self.sliding_window is not None:
+                        in_data = in_data.copy()
+                    await queue.put(in_data)
+            finally:
+                await queue.put(None)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                in_data = await queue.get()
+                if in_data is None:
+                    break
+                yield await self._apply_async(in_data, in_executor, executor)
+            await producer
+        finally:
+            producer.cancel()
+
+    def apply_batch(self, n_blocks: int):
+        """
+        Reads up to n_blocks complete blocks and processes them by the ChainOfMethods in one batch,
+        the result is the batch result of the chain. The last incomplete block of the file is left
+        for apply, so its result is calculated from its true length. None is returned if no complete block is left.
+        """
+        batch = self._read_full_blocks(n_blocks)
+        if not len(batch):
+            return None
+        return self.chain_of_methods.process_batch(batch)
 
-    def get_iterations(self) -> int:
-        frames = self.wav_file.getnframes()
+    def get_iterations(self, seconds: Optional[float] = None, *, n_blocks: Optional[int] = None) -> int:
+        """
+        Return the amount of iterations (calls of apply) needed to process the whole file
+        or the passed amount of seconds. With n_blocks it is the amount of apply_batch calls
+        over the complete blocks, the last incomplete block is left for apply.
+        """
+        frames = self.nframes
+        if seconds is not None:
+            frames = min(int(seconds * self.samplerate), frames)
+        if self.hop_size is not None:
+            remaining_frames = max(frames - self.blocksize, 0)
+            return 1 + -(-remaining_frames // self.hop_size)
+        if n_blocks is not None:
+            return -(-(frames // self.blocksize) // n_blocks)
         iterations = frames // self.blocksize
         if frames % self.blocksize != 0:
             iterations += 1
@@ -0,0 +1,28 @@
+import json
+
+from audiochains.benchmarks import run_benchmarks, main
+
+
+def test_benchmark_records():
+    report = run_benchmarks(
+        cases=['RMSFromArray', 'chain:spectrum'],
+        samplerates=[16000],
+        blocksizes=[512],
+        seconds=0.5,
+        repeats=1
+    )
+    assert [(record['case'], record['source']) for record in report['results']] == [
+        ('RMSFromArray', 'synthetic'),
+        ('chain:spectrum', 'synthetic'),
+        ('RMSFromArray', 'test_playback.wav'),
+        ('chain:spectrum', 'test_playback.wav'),
+    ]
+    assert all(record['real_time_factor'] > 0 for record in report['results'])
+
+
+def test_benchmark_json_output(tmp_path):
+    output = tmp_path / 'results.json'
+    main(['--cases', 'DBLog10', '--samplerates', '8000', '--blocksizes', '256',
+          '--seconds', '0.25', '--repeats', '1', '--no-playback', '-o', str(output)])
+    with open(output) as output_file:
+        assert json.load(output_file)['results'][0]['case'] == 'DBLog10'
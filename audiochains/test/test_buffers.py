@@ -0,0 +1,17 @@
+from audiochains.buffers import RingBuffer
+
+
+def test_ring_buffer_order():
+    ring_buffer = RingBuffer(block_bytes=4, capacity=3)
+    for value in range(3):
+        assert ring_buffer.put(bytes([value] * 4))
+    assert [ring_buffer.get() for _ in range(3)] == [bytes([value] * 4) for value in range(3)]
+    assert ring_buffer.is_empty()
+
+
+def test_ring_buffer_counters():
+    ring_buffer = RingBuffer(block_bytes=4, capacity=2)
+    assert ring_buffer.get() is None
+    for _ in range(3):
+        ring_buffer.put(bytes(4))
+    assert (ring_buffer.overflows, ring_buffer.underflows, len(ring_buffer)) == (1, 1, 2)
@@ -0,0 +1,155 @@
+import wave
+
+import numpy as np
+
+from audiochains.block_methods import (
+    BlockAudioMethod,
+    UnpackRawInFloat32,
+    PackFloat32InRaw,
+    RMSFromArray,
+    DBLog10,
+    HammingWindow,
+    FourierTransform,
+    VoiceActivityDetector
+)
+from audiochains.chains import ChainOfMethods, GraphOfMethods
+from audiochains.streams import StreamFromFile
+
+
+def test_chain_profiling():
+    reports = list()
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        file_stream.set_methods(
+            UnpackRawInFloat32(),
+            RMSFromArray(),
+            DBLog10()
+        )
+        stats = file_stream.chain_of_methods.enable_profiling(
+            blocksize=file_stream.blocksize,
+            samplerate=file_stream.samplerate,
+            hook=lambda chain_stats: reports.append(chain_stats.report()),
+            hook_every=10
+        )
+        for _ in range(file_stream.get_iterations()):
+            file_stream.apply()
+
+    iterations = file_stream.get_iterations()
+    report = stats.report()
+    assert len(reports) == iterations // 10
+    assert [method['calls'] for method in report['methods']] == [iterations] * 3
+    assert report['methods'][0]['bytes_in'] == iterations * 2048
+    assert 0 < report['chain']['p50'] <= report['chain']['p99']
+    assert report['budget'] == 1024 / file_stream.samplerate
+
+
+def test_chain_profiling_disabled():
+    chain = ChainOfMethods(RMSFromArray())
+    chain.enable_profiling()
+    chain.disable_profiling()
+    assert chain.stats is None
+
+
+class CountingMethod(BlockAudioMethod):
+    def __init__(self, method):
+        self.method = method
+        self.calls = 0
+
+    def __call__(self, in_data):
+        self.calls += 1
+        return self.method(in_data)
+
+
+class MaxAbsolute(BlockAudioMethod):
+    def __call__(self, in_data):
+        return np.abs(in_data).max()
+
+
+def test_graph_shares_prefix():
+    unpack = CountingMethod(UnpackRawInFloat32())
+    window = HammingWindow()
+    graph = GraphOfMethods({
+        'rms': (unpack, RMSFromArray()),
+        'db': (unpack, RMSFromArray(), DBLog10()),
+        'spectrum': (unpack, window, FourierTransform(framerate=44800)),
+        'peak': ChainOfMethods(unpack, window, MaxAbsolute()),
+    }, workers=2)
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        for _ in range(4):
+            in_data = file_stream.read(file_stream.blocksize)
+            results = graph(in_data)
+            samples = UnpackRawInFloat32()(in_data)
+            assert results['rms'] == RMSFromArray()(samples)
+            assert results['db'] == DBLog10()(RMSFromArray()(samples))
+            assert results['peak'] == np.abs(HammingWindow()(samples)).max()
+            assert results['spectrum'].amplitude.shape == (513,)
+    graph.close()
+    assert unpack.calls == 4
+    assert len(graph.chain) == 7
+
+
+def test_voice_activity_detector_gates_chain():
+    samplerate, blocksize = 16000, 1024
+    rng = np.random.default_rng(1)
+    noise = [rng.normal(0, 0.005, blocksize).astype(np.float32) for _ in range(20)]
+    tone = [(0.3 * np.sin(np.arange(blocksize) / 3) + block).astype(np.float32) for block in noise[:5]]
+    blocks = noise[:10] + tone + noise[10:]
+
+    after_gate = CountingMethod(RMSFromArray())
+    chain = ChainOfMethods(VoiceActivityDetector(samplerate, hangover_blocks=1), after_gate, DBLog10())
+    graph = GraphOfMethods({
+        'db': (chain.chain[0], after_gate, DBLog10()),
+        'rms': (RMSFromArray(),),
+    })
+    results = [chain(block) for block in blocks]
+    assert [result is not None for result in results] == [False] * 10 + [True] * 6 + [False] * 9
+    assert after_gate.calls == 6
+
+    graph.chain[0].reset()
+    outputs = graph(noise[-1])
+    assert outputs['db'] is None and outputs['rms'] is not None
+
+
+def test_voice_activity_detector_gates_batch(tmp_path):
+    samplerate, blocksize = 16000, 1024
+    rng = np.random.default_rng(1)
+    noise = [rng.normal(0, 0.005, blocksize) for _ in range(20)]
+    tone = [0.3 * np.sin(np.arange(blocksize) / 3) + block for block in noise[:5]]
+    with wave.open(str(tmp_path / 'gated.wav'), 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(samplerate)
+        wav_file.writeframes(PackFloat32InRaw()(np.concatenate(noise[:10] + tone + noise[10:])))
+
+    with StreamFromFile(filename=str(tmp_path / 'gated.wav'), blocksize=blocksize) as file_stream:
+        file_stream.set_methods(UnpackRawInFloat32(), VoiceActivityDetector(samplerate, hangover_blocks=1),
+                                RMSFromArray(), DBLog10())
+        expected = [file_stream.apply() for _ in range(file_stream.get_iterations())]
+        file_stream.seek(0)
+        file_stream.chain_of_methods.reset()
+        results = file_stream.apply_batch(16) + file_stream.apply_batch(16)
+
+    assert [result is not None for result in expected] == [False] * 10 + [True] * 6 + [False] * 9
+    assert len(results) == len(expected)
+    assert all(result is None if value is None else np.isclose(result, value)
+               for result, value in zip(results, expected))
+
+    chain = ChainOfMethods(VoiceActivityDetector(samplerate), RMSFromArray())
+    assert chain.process_batch(np.zeros((4, blocksize), np.float32)[:, :0]) == [None] * 4
+
+    batch = np.stack(noise[:10] + tone + noise[10:]).astype(np.float32)
+    spectrum = ChainOfMethods(VoiceActivityDetector(samplerate, hangover_blocks=1), HammingWindow(),
+                              FourierTransform(samplerate))
+    expected = [spectrum(block) for block in batch]
+    spectrum.reset()
+    results = spectrum.process_batch(batch)
+    assert [result is None for result in results] == [value is None for value in expected]
+    assert all(np.allclose(result.amplitude, value.amplitude)
+               for result, value in zip(results, expected) if value is not None)
+
+    vad = VoiceActivityDetector(samplerate, hangover_blocks=1)
+    graph = GraphOfMethods({'gated': (vad, RMSFromArray()), 'rms': (RMSFromArray(),)})
+    outputs = graph.process_batch(batch)
+    assert np.allclose(outputs['rms'], [RMSFromArray()(block) for block in batch])
+    assert [value is None for value in outputs['gated']] == [value is None for value in expected]
+    assert all(np.isclose(value, RMSFromArray()(block))
+               for value, block in zip(outputs['gated'], batch) if value is not None)
@@ -0,0 +1,19 @@
+from audiochains.block_methods import UnpackRawInInt16, RMSFromArray
+from audiochains.chains import ChainOfMethods
+from audiochains.engines import process_files
+from audiochains.streams import StreamFromFile
+
+
+def test_process_files_matches_serial_processing():
+    chain = ChainOfMethods(
+        UnpackRawInInt16(),
+        RMSFromArray()
+    )
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, chain_of_methods=chain) as file_stream:
+        expected = [file_stream.apply() for _ in range(file_stream.get_iterations())]
+
+    results = process_files(['test_playback.wav', 'test_playback.wav'], chain, workers=2)
+    assert results == [expected, expected]
+
+    results = process_files(['test_playback.wav'], chain, workers=2, blocks_per_task=10)
+    assert results == [expected]
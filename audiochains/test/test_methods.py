@@ -1,11 +1,36 @@
+import wave
+
+import numpy as np
+from librosa import power_to_db
+from librosa.feature import melspectrogram, mfcc
+from scipy.signal import resample_poly
+
 from audiochains.block_methods import (
     UnpackRawInInt16,
+    UnpackRawInFloat32,
     RMSFromBytes,
     RMSFromArray,
     DBLog10,
-    SoundPressureThreshold
+    BandPassFilter,
+    HammingWindow,
+    FourierTransform,
+    HammingSpectrum,
+    StreamingMFCC,
+    StreamingYIN,
+    PraatPitch,
+    SoundPressureThreshold,
+    StreamingResample,
+    UnpackRawSamples,
+    PackFloat32InRaw,
+    RunningRMS,
+    RunningPeak,
+    ExponentialRMS,
+    ExponentialPeak,
+    VoiceActivityDetector
 )
-from audiochains.output_types import VoiceRange
+from audiochains.chains import ChainOfMethods
+from audiochains.readers import wav_sample_format
+from audiochains.output_types import VoiceRange, FourierTuple
 from audiochains.streams import StreamFromFile
 
 
@@ -43,3 +68,371 @@ def test_sound_pressure_threshold():
         assert isinstance(file_stream.apply(), VoiceRange)
         for _ in range(file_stream.get_iterations()):
             file_stream.apply()
+
+
+def test_batch_matches_block_by_block():
+    chain = ChainOfMethods(
+        UnpackRawInInt16(),
+        RMSFromArray(),
+        DBLog10(),
+        SoundPressureThreshold(
+            silence_value=10.0,
+            whisper_value=30.0,
+            normal_value=50.0
+        )
+    )
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        file_stream.set_chain(chain)
+        expected = [file_stream.apply() for _ in range(file_stream.get_iterations())]
+
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        file_stream.set_chain(chain)
+        batches = [file_stream.apply_batch(16) for _ in range(file_stream.get_iterations(n_blocks=16))]
+
+    assert list(np.concatenate(batches)[:len(expected)]) == expected
+
+
+def test_batch_leaves_last_short_block_for_apply(tmp_path):
+    with wave.open('test_playback.wav', 'rb') as source:
+        parameters = source.getparams()
+        frames = source.readframes(10000)
+    with wave.open(str(tmp_path / 'short.wav'), 'wb') as wav_file:
+        wav_file.setparams(parameters)
+        wav_file.writeframes(frames)
+
+    chains = (
+        ChainOfMethods(UnpackRawInInt16(), RMSFromArray(), DBLog10()),
+        ChainOfMethods(UnpackRawInFloat32(), HammingWindow(), FourierTransform(framerate=parameters.framerate)),
+    )
+    for chain, use_mmap in ((chain, use_mmap) for chain in chains for use_mmap in (False, True)):
+        with StreamFromFile(filename=str(tmp_path / 'short.wav'), blocksize=1024, chain_of_methods=chain,
+                            use_mmap=use_mmap) as file_stream:
+            expected = [file_stream.apply() for _ in range(file_stream.get_iterations())]
+            file_stream.seek(0)
+            assert file_stream.get_iterations(n_blocks=4) == 3
+            batches = [file_stream.apply_batch(4) for _ in range(file_stream.get_iterations(n_blocks=4))]
+            assert file_stream.apply_batch(4) is None
+            tail = file_stream.apply()
+        assert len(expected) == 10
+        if isinstance(tail, FourierTuple):
+            assert [len(batch.amplitude) for batch in batches] == [4, 4, 1]
+            amplitude = np.concatenate([batch.amplitude for batch in batches])
+            assert np.allclose(amplitude, [spectrum.amplitude for spectrum in expected[:9]], atol=1e-4)
+            assert np.array_equal(tail.amplitude, expected[9].amplitude)
+        else:
+            assert np.allclose(np.concatenate(batches), expected[:9])
+            assert tail == expected[9]
+
+
+def test_batch_fallback_and_spectrum():
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        file_stream.set_methods(
+            RMSFromBytes()
+        )
+        assert len(file_stream.apply_batch(8)) == 8
+
+        file_stream.set_methods(
+            UnpackRawInFloat32(),
+            HammingWindow(),
+            FourierTransform(framerate=file_stream.samplerate)
+        )
+        spectrum = file_stream.apply_batch(8)
+        assert spectrum.amplitude.shape == (8, 513)
+        assert spectrum.frequency.shape == (513,)
+
+
+def test_unpack_into_preallocated_array():
+    out = np.empty(1024, dtype=np.float32)
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        in_data = file_stream.read(file_stream.blocksize)
+    unpacked = UnpackRawInFloat32(out=out)(in_data)
+    assert unpacked.base is out or unpacked is out
+    assert np.array_equal(unpacked, UnpackRawInFloat32()(in_data))
+
+
+def test_overlapping_blocks():
+    with wave.open('test_playback.wav', 'rb') as wav_file:
+        samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), np.int16)
+
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, hop_size=256) as file_stream:
+        file_stream.set_methods(
+            UnpackRawInInt16()
+        )
+        iterations = file_stream.get_iterations()
+        assert iterations == 1 + (len(samples) - 1024) // 256
+        for iteration in range(iterations):
+            block = file_stream.apply()
+            assert np.array_equal(block, samples[iteration * 256: iteration * 256 + 1024])
+        assert file_stream.read_block() is None
+        assert file_stream.apply() is None
+
+
+def test_streaming_band_pass_filter_is_continuous():
+    samples = np.random.default_rng(0).normal(0, 1000, 8192).astype(np.float32)
+    whole_filter = BandPassFilter(sample_rate=16000, out_type=np.float64, streaming=True)
+    block_filter = BandPassFilter(sample_rate=16000, out_type=np.float64, streaming=True)
+
+    expected = whole_filter(samples)
+    filtered = np.concatenate([block_filter(block) for block in np.split(samples, 8)])
+    assert np.allclose(filtered, expected)
+
+    stereo_filter = BandPassFilter(sample_rate=16000, out_type=np.float64, streaming=True, channels=2)
+    stereo = stereo_filter(np.repeat(samples, 2))
+    assert np.allclose(stereo[::2], expected) and np.allclose(stereo[1::2], expected)
+
+
+def test_hamming_spectrum_matches_chain():
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        chain = ChainOfMethods(
+            UnpackRawInInt16(),
+            HammingWindow(),
+            FourierTransform(framerate=file_stream.samplerate)
+        )
+        fused = ChainOfMethods(
+            UnpackRawInInt16(),
+            HammingSpectrum(framerate=file_stream.samplerate, blocksize=1024)
+        )
+        for _ in range(4):
+            in_data = file_stream.read(file_stream.blocksize)
+            expected, spectrum = chain(in_data), fused(in_data)
+            assert np.allclose(spectrum.amplitude, expected.amplitude)
+            assert np.array_equal(spectrum.frequency, expected.frequency)
+
+
+def test_memory_mapped_stream_matches_wave_reader():
+    chain = ChainOfMethods(
+        UnpackRawInInt16(),
+        RMSFromArray()
+    )
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, chain_of_methods=chain) as file_stream:
+        expected = [file_stream.apply() for _ in range(file_stream.get_iterations())]
+
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, chain_of_methods=chain,
+                        use_mmap=True) as file_stream:
+        assert [file_stream.apply() for _ in range(file_stream.get_iterations())] == expected
+        file_stream.seek(40)
+        assert file_stream.apply() == expected[40]
+        file_stream.seek_time(0.5)
+        assert file_stream.get_iterations(0.5) == len(file_stream.read_batch(22))
+        assert file_stream.get_iterations(None, n_blocks=16) == -(-file_stream.get_iterations() // 16)
+
+
+def test_streaming_mfcc_matches_whole_signal():
+    samples = np.random.default_rng(0).normal(0, 0.1, 16000).astype(np.float32)
+    streaming_mfcc = StreamingMFCC(samplerate=16000, n_mfcc=13, n_fft=512, hop_length=160, n_mels=40)
+    coefficients = np.concatenate([streaming_mfcc(block) for block in np.split(samples, 25)], axis=1)
+
+    mel_spectrogram = melspectrogram(y=samples, sr=16000, n_fft=512, hop_length=160, n_mels=40, center=False)
+    expected = mfcc(S=power_to_db(mel_spectrogram, top_db=None), n_mfcc=13)
+    assert coefficients.shape == expected.shape
+    assert np.allclose(coefficients, expected, atol=1e-3)
+
+
+def test_streaming_yin_tracks_pitch():
+    time = np.arange(16000) / 16000
+    samples = (0.5 * np.sin(2 * np.pi * 220 * time) + 0.2 * np.sin(2 * np.pi * 440 * time)).astype(np.float32)
+    streaming_yin = StreamingYIN(frame_rate=16000, f_min=50, f_max=500)
+    pitch = [streaming_yin(block) for block in np.split(samples, 16)]
+    frequency = np.concatenate([block_pitch.frequency for block_pitch in pitch])
+    confidence = np.concatenate([block_pitch.confidence for block_pitch in pitch])
+
+    assert np.allclose(frequency, 220, atol=1)
+    assert np.all(confidence > 0.9)
+    assert np.array_equal(StreamingYIN(frame_rate=16000)(np.zeros(2048, dtype=np.float32)).frequency, np.zeros(5))
+
+
+def test_praat_pitch_analysis_window():
+    time = np.arange(32000) / 16000
+    samples = 0.5 * np.sin(2 * np.pi * 180 * time)
+    praat_pitch = PraatPitch(frame_rate=16000, analysis_window=0.25)
+    pitch = [praat_pitch(block) for block in np.split(samples, 64)]
+    assert pitch[:7] == [0] * 7
+    assert np.allclose(pitch[7:], 180, atol=1)
+
+
+def test_praat_pitch_over_file(tmp_path):
+    _write_tone(tmp_path / 'tone.wav', 150, 2, seconds=2.0)
+    with StreamFromFile(filename=str(tmp_path / 'tone.wav'), blocksize=4000) as file_stream:
+        pitch = PraatPitch(frame_rate=file_stream.samplerate).process_file(file_stream)
+        assert pitch.shape == (file_stream.get_iterations(),)
+    assert np.allclose(pitch, 150, atol=1)
+
+    with StreamFromFile(filename=str(tmp_path / 'tone.wav'), blocksize=4000, hop_size=2000) as file_stream:
+        pitch = PraatPitch(frame_rate=file_stream.samplerate).process_file(file_stream)
+        assert pitch.shape == (file_stream.get_iterations(),) == (15,)
+    assert np.allclose(pitch, 150, atol=1)
+
+
+def test_stereo_blocks_are_processed_per_channel():
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        left = np.frombuffer(file_stream.read(file_stream.blocksize), np.int16)
+    right = left // 2
+    stereo = np.stack((left, right), axis=1).tobytes()
+
+    unpacked = UnpackRawInInt16(channels=2)(stereo)
+    assert unpacked.shape == (1024, 2) and np.shares_memory(unpacked, np.frombuffer(stereo, np.int16))
+
+    chain = ChainOfMethods(
+        UnpackRawInInt16(channels=2),
+        RMSFromArray(),
+        DBLog10(),
+        SoundPressureThreshold(
+            silence_value=10.0,
+            whisper_value=30.0,
+            normal_value=50.0
+        )
+    )
+    mono_chain = ChainOfMethods(*chain.chain[1:])
+    assert list(chain(stereo)) == [mono_chain(left), mono_chain(right)]
+    assert list(RMSFromBytes(channels=2)(stereo)) == [RMSFromBytes()(left.tobytes()), RMSFromBytes()(right.tobytes())]
+
+    samples = UnpackRawInFloat32(channels=2)(stereo)
+    spectrum = FourierTransform(framerate=16000)(HammingWindow()(samples))
+    assert spectrum.amplitude.shape == (513, 2)
+    assert np.allclose(spectrum.amplitude[:, 1], FourierTransform(framerate=16000)(HammingWindow()(samples[:, 1])).amplitude)
+
+
+def test_streaming_resample_matches_resample_poly():
+    with StreamFromFile(filename='test_playback.wav', blocksize=1000) as file_stream:
+        unpack, resample = UnpackRawInFloat32(), StreamingResample(in_rate=file_stream.samplerate, out_rate=16000)
+        samples, resampled = list(), list()
+        for _ in range(file_stream.get_iterations()):
+            samples.append(unpack(file_stream.read(file_stream.blocksize)))
+            resampled.append(resample(samples[-1]))
+        n_input = sum(len(block) for block in samples)
+
+    resampled = np.concatenate(resampled)
+    assert len(resampled) == -(-n_input * resample.up // resample.down)
+    delay = int(resample.delay)
+    expected = resample_poly(np.concatenate(samples + [np.zeros(1000, np.float32)]), resample.up, resample.down)
+    assert np.allclose(resampled[delay:], expected[:len(resampled) - delay], atol=1e-5)
+
+
+def test_unpack_and_pack_every_sample_width():
+    samples = np.random.default_rng(0).uniform(-1, 1, size=(500, 2)).astype(np.float32)
+    for sample_format, sampwidth, tolerance in (
+            ('uint8', 1, 2 ** -7), ('int8', 1, 2 ** -7), ('int16', 2, 2 ** -15),
+            ('int24', 3, 2 ** -23), ('int32', 4, 2 ** -31), ('float32', 4, 0)):
+        raw_data = PackFloat32InRaw(sample_format=sample_format)(samples)
+        assert len(raw_data) == samples.size * sampwidth
+        unpacked = UnpackRawInFloat32(channels=2, sample_format=sample_format)(raw_data)
+        assert unpacked.shape == samples.shape
+        assert np.abs(unpacked - samples).max() <= tolerance
+
+    raw_data = PackFloat32InRaw(sampwidth=3)(samples)
+    expected = [int.from_bytes(raw_data[i:i + 3], 'little', signed=True) for i in range(0, len(raw_data), 3)]
+    assert UnpackRawSamples(sampwidth=3)(raw_data).tolist() == expected
+
+
+def test_unpack_from_stream_format():
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024) as file_stream:
+        unpack = UnpackRawInFloat32.from_stream(file_stream)
+        assert (unpack.sampwidth, unpack.channels) == (file_stream.sampwidth, file_stream.channels)
+        in_data = file_stream.read(file_stream.blocksize)
+        assert np.array_equal(unpack(in_data), UnpackRawInFloat32()(in_data))
+        assert PackFloat32InRaw.from_stream(file_stream)(unpack(in_data)) == in_data
+
+
+def _write_tone(file_name, frequency, sampwidth, framerate=16000, seconds=1.0):
+    samples = 0.5 * np.sin(2 * np.pi * frequency * np.arange(int(framerate * seconds)) / framerate)
+    with wave.open(str(file_name), 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(sampwidth)
+        wav_file.setframerate(framerate)
+        wav_file.writeframes(PackFloat32InRaw(sample_format=wav_sample_format(sampwidth))(samples))
+    return samples
+
+
+def test_unsigned_8bit_and_integer_32bit_wav(tmp_path):
+    assert np.array_equal(UnpackRawInFloat32(sampwidth=1)(bytes([128] * 4)), np.zeros(4))
+    assert PackFloat32InRaw(sampwidth=1)(np.zeros(4, np.float32)) == bytes([128] * 4)
+
+    for sampwidth, sample_format in ((1, 'uint8'), (4, 'int32')):
+        file_name = tmp_path / f'tone_{sampwidth}.wav'
+        samples = _write_tone(file_name, 200, sampwidth)
+        for use_mmap in (False, True):
+            with StreamFromFile(filename=str(file_name), blocksize=1000, use_mmap=use_mmap) as file_stream:
+                assert file_stream.sample_format == sample_format
+                unpack = UnpackRawInFloat32.from_stream(file_stream)
+                assert np.abs(unpack(file_stream.read(1000)) - samples[:1000]).max() <= 2 ** -7
+
+
+def test_praat_pitch_over_24bit_file(tmp_path):
+    _write_tone(tmp_path / 'tone.wav', 200, 3)
+    with StreamFromFile(filename=str(tmp_path / 'tone.wav'), blocksize=4000) as file_stream:
+        pitch = PraatPitch(frame_rate=file_stream.samplerate).process_file(file_stream)
+    assert np.allclose(pitch, 200, atol=1)
+
+
+def test_running_statistics_match_recalculation():
+    windows = (1, 5, 37)
+    rng = np.random.default_rng(0)
+    blocks = [(rng.normal(size=(rng.integers(100, 300), 2)) * 3000).astype(np.int16) for _ in range(120)]
+    running_rms, running_peak = RunningRMS(windows=windows), RunningPeak(windows=windows)
+    for index, block in enumerate(blocks):
+        rms, peak = running_rms(block), running_peak(block)
+        for window_index, window in enumerate(windows):
+            latest = np.concatenate(blocks[max(0, index - window + 1):index + 1]).astype(np.float64)
+            assert np.allclose(rms[window_index], np.sqrt((latest * latest).mean(axis=0)))
+            assert np.array_equal(peak[window_index], np.abs(latest).max(axis=0))
+
+    meter = ChainOfMethods(RunningRMS(windows=(0.1, 1.0), block_duration=0.05), DBLog10(),
+                           SoundPressureThreshold(10.0, 30.0, 50.0))
+    assert np.array_equal(meter(blocks[0][:, 0]), [VoiceRange.LOUD, VoiceRange.LOUD])
+
+    smoothed = ExponentialRMS(time_constants=4)
+    for block in blocks:
+        level = smoothed(block[:, 0])
+    assert abs(level - 3000) < 300
+
+
+def test_exponential_peak_attack_and_release():
+    decay = np.exp(-1 / 4)
+    peak = ExponentialPeak(release=0.2, block_duration=0.05)
+    block_peaks = [0.5, 0.1, 0.1, -0.8, 0.0, 0.6]
+    levels = [peak(np.array([0.0, value, -value / 2], dtype=np.float32)) for value in block_peaks]
+    expected = [0.5, 0.5 * decay, 0.5 * decay ** 2, 0.8, 0.8 * decay, 0.6]
+    assert np.allclose(levels, expected)
+
+    peak.reset()
+    stereo = np.array([[-32768, 100], [0, -200]], dtype=np.int16)
+    assert np.array_equal(peak(stereo), [32768, 200])
+    assert np.allclose(peak(np.zeros((2, 2), dtype=np.int16)), [32768 * decay, 200 * decay])
+
+
+def test_db_and_threshold_process_arrays():
+    values = np.concatenate(([0, -1.0, 1e-9], np.random.default_rng(0).uniform(0, 5000, size=200)))
+    db_log10, threshold = DBLog10(), SoundPressureThreshold(10.0, 30.0, 50.0)
+    db = db_log10(values)
+    assert np.array_equal(db, [db_log10(value) for value in values])
+    labels = threshold(db)
+    assert labels.dtype == np.int8
+    assert labels.tolist() == [threshold(value) for value in db]
+
+    floored = DBLog10(floor=-60.0, reference=2 ** 15, decimals=None)
+    assert np.array_equal(floored(values[:3]), [-60.0, -60.0, -60.0])
+    assert np.allclose(floored(values[3:]), np.maximum(20 * np.log10(values[3:] / 2 ** 15), -60.0))
+    assert floored(0) == -60.0
+
+
+def test_voice_activity_detector_adapts_to_noise():
+    samplerate, blocksize = 16000, 1024
+    rng = np.random.default_rng(0)
+    time = np.arange(samplerate * 8) / samplerate
+    signal = rng.normal(0, 0.005, len(time))
+    signal[4 * samplerate:] += rng.normal(0, 0.02, 4 * samplerate)
+    voiced = (time >= 2) & (time < 3) | (time >= 5) & (time < 6)
+    signal[voiced] += 0.3 * np.sin(2 * np.pi * 200 * time[voiced])
+    signal = signal.astype(np.float32)
+
+    vad = VoiceActivityDetector(samplerate, hangover_blocks=2, gate=False)
+    starts = range(0, len(signal) - blocksize + 1, blocksize)
+    decisions = np.array([vad(signal[start:start + blocksize]) for start in starts])
+    block_times = np.array(starts) / samplerate
+
+    inside = ((block_times >= 2) & (block_times + blocksize / samplerate < 3) |
+              (block_times >= 5) & (block_times + blocksize / samplerate < 6))
+    far_outside = ((block_times > 0.5) & (block_times < 1.8) | (block_times > 3.3) & (block_times < 4.8) |
+                   (block_times > 6.3))
+    assert decisions[inside].all()
+    assert not decisions[far_outside].any()
@@ -0,0 +1,19 @@
+import wave
+
+import numpy as np
+
+from audiochains.readers import MappedWAV
+
+
+def test_mapped_wav_matches_wave_module():
+    with wave.open('test_playback.wav', 'rb') as wav_file:
+        parameters = wav_file.getparams()
+        samples = np.frombuffer(wav_file.readframes(parameters.nframes), np.int16)
+
+    with MappedWAV('test_playback.wav') as mapped_file:
+        assert (mapped_file.framerate, mapped_file.channels, mapped_file.sampwidth, mapped_file.nframes) == (
+            parameters.framerate, parameters.nchannels, parameters.sampwidth, parameters.nframes)
+        assert np.array_equal(mapped_file.samples[:, 0], samples)
+        assert np.array_equal(mapped_file.block(3, 1024).view(np.int16), samples[3072:4096])
+        assert np.array_equal(mapped_file.time_slice(0.5, 1.0)[:, 0],
+                              samples[parameters.framerate // 2:parameters.framerate])
@@ -1,9 +1,14 @@
+import asyncio
+
 import pytest
+import numpy as np
 import wave
 import json
+import sounddevice as sd
 from audiochains.writers import WriterInWAV
 from audiochains.streams import IOStream, InputStream, StreamFromFile
 from audiochains.chains import ChainOfMethods
+from audiochains.exceptions import AppException
 from audiochains.block_methods import RMSFromArray, UnpackRawInFloat32
 
 
@@ -186,3 +191,107 @@ def test_input_stream_set_chain():
         stream.set_chain(chain)
         for _ in range(stream.get_iterations(seconds=1)):
             stream.apply()
+
+
+def test_input_stream_callback_mode():
+    with InputStream(json_file='test_config.json', ring_buffer_blocks=16) as stream:
+        stream.set_methods(
+            UnpackRawInFloat32(),
+            RMSFromArray()
+        )
+        for _ in range(stream.get_iterations(seconds=1)):
+            stream.apply()
+        assert stream.overflows == 0
+
+
+def test_io_stream_callback_mode():
+    with IOStream(json_file='test_config.json', ring_buffer_blocks=16) as stream:
+        stream.set_methods(
+            UnpackRawInFloat32(),
+            RMSFromArray()
+        )
+        for _ in range(stream.get_iterations(seconds=1)):
+            stream.apply()
+        assert stream.overflows == 0
+
+
+def test_input_stream_zero_copy():
+    with InputStream(json_file='test_config.json', zero_copy=True) as stream:
+        stream.set_methods(
+            UnpackRawInFloat32(out=np.empty(stream.blocksize, dtype=np.float32)),
+            RMSFromArray()
+        )
+        first_block = stream.read(stream.blocksize)
+        assert stream.read(stream.blocksize) is first_block
+        for _ in range(stream.get_iterations(seconds=1)):
+            stream.apply()
+
+
+def test_input_stream_zero_copy_without_sounddevice_internals(monkeypatch):
+    monkeypatch.delattr(sd, '_lib', raising=False)
+    with InputStream(json_file='test_config.json', zero_copy=True) as stream:
+        first_block = stream.read(stream.blocksize)
+        assert isinstance(first_block, np.ndarray) and len(first_block) == stream.blocksize * stream.samplesize
+        assert stream.read(stream.blocksize) is first_block
+        assert len(stream.read(stream.blocksize // 2)) == len(first_block) // 2
+
+
+def test_input_stream_overlapping_blocks():
+    with InputStream(json_file='test_config.json', hop_size=256) as stream:
+        stream.set_methods(
+            UnpackRawInFloat32(),
+            RMSFromArray()
+        )
+        assert stream.get_iterations(seconds=1) == int(stream.samplerate / 256)
+        for _ in range(stream.get_iterations(seconds=1)):
+            stream.apply()
+
+
+def test_stream_from_file_async_iteration():
+    async def collect(file_stream):
+        return [value async for value in file_stream.aiter_apply(in_executor=True)]
+
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, hop_size=512) as file_stream:
+        file_stream.set_methods(UnpackRawInFloat32(), RMSFromArray())
+        results = asyncio.run(collect(file_stream))
+        assert len(results) == file_stream.get_iterations()
+        assert file_stream.read_block() is None
+
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, hop_size=512) as file_stream:
+        file_stream.set_methods(UnpackRawInFloat32(), RMSFromArray())
+        assert results == [file_stream.apply() for _ in range(file_stream.get_iterations())]
+
+
+def test_input_stream_async_iteration():
+    async def collect(stream):
+        return [value async for value in stream.aiter_apply(seconds=1, max_pending=4, in_executor=True)]
+
+    with InputStream(json_file='test_config.json', ring_buffer_blocks=16) as stream:
+        stream.set_methods(
+            UnpackRawInFloat32(),
+            RMSFromArray()
+        )
+        assert len(asyncio.run(collect(stream))) == stream.get_iterations(seconds=1)
+        assert stream.overflows == 0
+
+
+@pytest.mark.parametrize('stream_parameters', [
+    {'ring_buffer_blocks': 4, 'hop_size': 256},
+    {'zero_copy': True, 'blocksize': 0},
+])
+def test_rejected_stream_is_closed(monkeypatch, stream_parameters):
+    closed = list()
+    monkeypatch.setattr(sd.RawInputStream, 'close', lambda self, *args, **kwargs: closed.append(self))
+    with pytest.raises(AppException.StreamException):
+        InputStream(samplerate=16000, channels=1, **stream_parameters)
+    assert len(closed) == 1
+
+
+def test_async_iteration_requires_callback_mode():
+    async def consume(stream):
+        async for _ in stream.aiter_apply():
+            pass
+
+    with InputStream(json_file='test_config.json') as stream:
+        with pytest.raises(AppException.StreamException):
+            asyncio.run(consume(stream))
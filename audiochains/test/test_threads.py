@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+
+from audiochains.block_methods import BlockAudioMethod, UnpackRawInInt16, RMSFromArray
+from audiochains.chains import ChainOfMethods
+from audiochains.streams import StreamFromFile
+from audiochains.threads import PipelinedRunner
+
+
+class RandomDelay(BlockAudioMethod):
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def __call__(self, in_data):
+        time.sleep(self.seconds * (hash(bytes(in_data[:16])) % 3))
+        return in_data
+
+
+def serial_results(chain):
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, chain_of_methods=chain) as file_stream:
+        return [file_stream.apply() for _ in range(file_stream.get_iterations())]
+
+
+def test_pipelined_runner_keeps_order():
+    chain = ChainOfMethods(RandomDelay(0.001), UnpackRawInInt16(), RMSFromArray())
+    results = list()
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, chain_of_methods=chain,
+                        use_mmap=True) as file_stream:
+        runner = PipelinedRunner(file_stream, workers=4, max_pending=4, on_result=results.append)
+        runner.start()
+        runner.join()
+    assert results == serial_results(chain)
+    assert runner.metrics()['dropped'] == 0
+    assert runner.max_queue_depth <= 4
+
+
+class NumberedBlocks:
+    """
+    The stream stub giving blocks filled with their own index
+    """
+    def __init__(self, n_blocks: int, blocksize: int = 1024):
+        self.n_blocks = n_blocks
+        self.blocksize = blocksize
+        self.chain_of_methods = None
+        self.index = 0
+
+    def read_block(self):
+        if self.index == self.n_blocks:
+            return None
+        self.index += 1
+        return np.full(self.blocksize, self.index - 1, dtype=np.int16).tobytes()
+
+
+def test_pipelined_runner_drops_oldest():
+    chain = ChainOfMethods(RandomDelay(0.002), UnpackRawInInt16(), lambda samples: int(samples[0]))
+    runner = PipelinedRunner(NumberedBlocks(100), chain_of_methods=chain, workers=2, max_pending=2,
+                             policy='drop_oldest')
+    runner.start()
+    runner.join()
+    results = [runner.results.get() for _ in range(runner.results.qsize())]
+    assert runner.dropped > 0
+    assert len(results) + runner.dropped == runner.captured == 100
+    assert results == sorted(set(results))
+    assert results[-1] == 99
+
+
+def test_pipelined_runner_stops_at_end_of_overlapping_file():
+    chain = ChainOfMethods(UnpackRawInInt16(), RMSFromArray())
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, chain_of_methods=chain,
+                        hop_size=512) as file_stream:
+        expected = [file_stream.apply() for _ in range(file_stream.get_iterations())]
+
+    results = list()
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, chain_of_methods=chain,
+                        hop_size=512) as file_stream:
+        runner = PipelinedRunner(file_stream, workers=2, on_result=results.append)
+        runner.start()
+        runner.join(timeout=10)
+        assert not any(thread.is_alive() for thread in [runner._capture_thread] + runner._workers)
+    assert runner.captured == len(expected)
+    assert results == expected
@@ -0,0 +1,191 @@
+import wave
+
+import numpy as np
+import pytest
+
+from audiochains.block_methods import (
+    UnpackRawInFloat32,
+    HammingWindow,
+    FourierTransform,
+    RMSFromBytes,
+    DBLog10,
+    SoundPressureThreshold,
+    StreamingMFCC,
+    StreamingYIN
+)
+from audiochains.chains import ChainOfMethods
+from audiochains.exceptions import AppException
+from audiochains.output_types import VoiceRange
+from audiochains.readers import MappedWAV, WAVE_FORMAT_IEEE_FLOAT, read_features
+from audiochains.streams import StreamFromFile
+from audiochains.writers import BufferedWriterInWAV, WriterInNPY, WriterInNPZ, SegmentedWriterInWAV
+
+
+def test_buffered_writer_matches_source_file(tmp_path):
+    with wave.open('test_playback.wav', 'rb') as source:
+        parameters = source.getparams()
+        frames = source.readframes(parameters.nframes)
+
+    block_bytes = 1000 * parameters.sampwidth * parameters.nchannels
+    file_name = str(tmp_path / 'buffered.wav')
+    writer = BufferedWriterInWAV(file_name, parameters.framerate, parameters.sampwidth, parameters.nchannels,
+                                 buffer_size=64 * 1024, n_buffers=2, fsync_interval=0.0)
+    for start in range(0, len(frames), block_bytes):
+        writer.write(frames[start:start + block_bytes])
+    writer.close()
+
+    with wave.open(file_name, 'rb') as result:
+        assert result.getparams()[:4] == parameters[:4]
+        assert result.getnframes() == parameters.nframes
+        assert result.readframes(result.getnframes()) == frames
+
+
+def test_buffered_writer_float_format_and_size_limit(tmp_path):
+    samples = np.random.default_rng(0).uniform(-1, 1, size=(1000, 2)).astype(np.float32)
+    file_name = str(tmp_path / 'float.wav')
+    with BufferedWriterInWAV(file_name, 16000, 4, 2) as writer:
+        writer.write(samples.tobytes())
+        writer.data_bytes = writer.max_data_bytes - 100
+        with pytest.raises(AppException.WriterException):
+            writer.write(samples.tobytes())
+        writer.data_bytes = samples.nbytes
+
+    mapped_file = MappedWAV(file_name)
+    assert mapped_file.format_tag == WAVE_FORMAT_IEEE_FLOAT
+    assert np.array_equal(mapped_file.samples, samples)
+    mapped_file.close()
+
+
+def chain_results():
+    spectrum_chain = ChainOfMethods(UnpackRawInFloat32(), HammingWindow(), FourierTransform(framerate=44800))
+    threshold_chain = ChainOfMethods(RMSFromBytes(), DBLog10(), SoundPressureThreshold(10.0, 30.0, 50.0))
+    with StreamFromFile(filename='test_playback.wav', blocksize=1024, use_mmap=True) as file_stream:
+        blocks = [file_stream.read(1024) for _ in range(file_stream.nframes // 1024)]
+    return [spectrum_chain(block) for block in blocks], [threshold_chain(block) for block in blocks]
+
+
+@pytest.mark.parametrize('writer_class, extension', [(WriterInNPY, '.npy'), (WriterInNPZ, '.npz')])
+def test_feature_writers_read_back(tmp_path, writer_class, extension):
+    spectra, labels = chain_results()
+    with writer_class(str(tmp_path / 'spectrum'), block_duration=0.5, chunk_rows=16) as writer:
+        for spectrum in spectra:
+            writer.write(spectrum)
+    with writer_class(str(tmp_path / 'labels'), chunk_rows=16) as writer:
+        for index, label in enumerate(labels):
+            writer.write(label, timestamp=index)
+
+    columns = read_features(str(tmp_path / 'spectrum') + ('.npz' if extension == '.npz' else ''))
+    assert np.array_equal(columns['amplitude'], np.stack([spectrum.amplitude for spectrum in spectra]))
+    assert np.array_equal(columns['frequency'], spectra[-1].frequency)
+    assert np.array_equal(columns['timestamp'], np.arange(len(spectra)) * 0.5)
+
+    columns = read_features(str(tmp_path / 'labels') + ('.npz' if extension == '.npz' else ''))
+    assert columns['value'].dtype == np.int8
+    assert [VoiceRange(value) for value in columns['value']] == labels
+    if extension == '.npy':
+        assert isinstance(columns['value'], np.memmap)
+
+
+@pytest.mark.parametrize('writer_class, extension', [(WriterInNPY, '.npy'), (WriterInNPZ, '.npz')])
+def test_feature_writers_keep_types_and_frames(tmp_path, writer_class, extension):
+    db_log10 = DBLog10()
+    with writer_class(str(tmp_path / 'db'), block_duration=0.5) as writer:
+        for value in (0, 1000, 3000):
+            writer.write(db_log10(value))
+    assert np.array_equal(read_features(str(tmp_path / 'db') + extension)['value'], [0, 60.0, 69.54])
+
+    samples = np.random.default_rng(0).normal(0, 0.1, 16000).astype(np.float32)
+    streaming_mfcc = StreamingMFCC(samplerate=16000, n_mfcc=13, n_fft=512, hop_length=160, n_mels=40)
+    streaming_yin = StreamingYIN(frame_rate=16000)
+    coefficients, pitch = list(), list()
+    with writer_class(str(tmp_path / 'mfcc'), block_duration=0.04, chunk_rows=7, frames=True) as mfcc_writer, \
+            writer_class(str(tmp_path / 'yin'), block_duration=0.04, chunk_rows=7, frames=True) as yin_writer:
+        for block in np.split(samples, 25):
+            coefficients.append(streaming_mfcc(block))
+            pitch.append(streaming_yin(block))
+            mfcc_writer.write(coefficients[-1])
+            yin_writer.write(pitch[-1])
+
+    columns = read_features(str(tmp_path / 'mfcc') + extension)
+    assert np.allclose(columns['value'], np.concatenate(coefficients, axis=1).T)
+    expected_blocks = np.concatenate([np.full(block.shape[1], index) for index, block in enumerate(coefficients)])
+    assert np.array_equal(columns['block'], expected_blocks)
+    assert np.allclose(columns['timestamp'], expected_blocks * 0.04)
+
+    columns = read_features(str(tmp_path / 'yin') + extension)
+    assert np.array_equal(columns['frequency'], np.concatenate([values.frequency for values in pitch]))
+    assert np.array_equal(columns['confidence'], np.concatenate([values.confidence for values in pitch]))
+
+
+def test_feature_writer_rejects_changed_shape(tmp_path):
+    with WriterInNPY(str(tmp_path / 'values')) as writer:
+        writer.write(np.zeros(4))
+        with pytest.raises(AppException.WriterException):
+            writer.write(np.zeros(5))
+
+    with WriterInNPY(str(tmp_path / 'labels')) as writer:
+        writer.write(VoiceRange.LOUD)
+        with pytest.raises(AppException.WriterException):
+            writer.write(12.5)
+
+    spectrum = FourierTransform(framerate=16000)(np.ones(1024, dtype=np.float32))
+    with WriterInNPZ(str(tmp_path / 'spectrum')) as writer:
+        writer.write(spectrum)
+        with pytest.raises(AppException.WriterException):
+            writer.write(FourierTransform(framerate=8000)(np.ones(1024, dtype=np.float32)))
+
+
+def test_segmented_writer_gates_silence(tmp_path):
+    blocksize = 1000
+    loud = (np.sin(np.arange(blocksize) / 5) * 8000).astype(np.int16)
+    pattern = [0] * 10 + [1] * 5 + [0] * 10 + [1] * 3 + [0] * 4
+    blocks = [loud if is_loud else np.zeros(blocksize, dtype=np.int16) for is_loud in pattern]
+    gate = ChainOfMethods(RMSFromBytes(), DBLog10(), SoundPressureThreshold(10.0, 30.0, 50.0))
+
+    reused_buffer = np.empty(blocksize, dtype=np.int16)
+    with SegmentedWriterInWAV(str(tmp_path / 'gated'), 16000, 2, 1, gate=gate,
+                              pre_roll_blocks=2, post_roll_blocks=1) as writer:
+        for block in blocks:
+            reused_buffer[:] = block
+            writer.write(reused_buffer)
+
+    assert [frame for _, frame in writer.segments] == [8 * blocksize, 23 * blocksize]
+    for (segment_name, frame), n_blocks in zip(writer.segments, (8, 6)):
+        with wave.open(segment_name, 'rb') as segment:
+            samples = np.frombuffer(segment.readframes(segment.getnframes()), dtype=np.int16)
+        start = frame // blocksize
+        assert np.array_equal(samples, np.concatenate(blocks[start:start + n_blocks]))
+
+
+def test_segmented_writer_uses_passed_voice_range(tmp_path):
+    block = np.ones(1024, dtype=np.int16)
+    ranges = [VoiceRange.SILENCE] * 3 + [VoiceRange.NORMAL] * 2 + [VoiceRange.SILENCE] * 2
+    with SegmentedWriterInWAV(str(tmp_path / 'ranges'), 16000, 2, 1) as writer:
+        for voice_range in ranges:
+            writer.write(block, voice_range=voice_range)
+        writer.write(block)
+
+    assert [frame for _, frame in writer.segments] == [3 * 1024, 7 * 1024]
+    with wave.open(writer.segments[0][0], 'rb') as segment:
+        assert segment.getnframes() == 2 * 1024
+
+
+def test_segmented_writer_rolls_files(tmp_path):
+    with wave.open('test_playback.wav', 'rb') as source:
+        parameters = source.getparams()
+        frames = source.readframes(parameters.nframes)
+
+    block_bytes = 1024 * parameters.sampwidth * parameters.nchannels
+    with SegmentedWriterInWAV(str(tmp_path / 'rolled'), parameters.framerate, parameters.sampwidth,
+                              parameters.nchannels, max_seconds=0.5) as writer:
+        for start in range(0, len(frames), block_bytes):
+            writer.write(frames[start:start + block_bytes])
+
+    written = b''
+    for segment_name, frame in writer.segments:
+        with wave.open(segment_name, 'rb') as segment:
+            assert segment.getnframes() <= parameters.framerate // 2
+            assert frame * parameters.sampwidth * parameters.nchannels == len(written)
+            written += segment.readframes(segment.getnframes())
+    assert len(writer.segments) > 1
+    assert written == frames
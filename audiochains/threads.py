@@ -1,10 +1,16 @@
-from typing import Callable
-from threading import Thread, Event
+from queue import Queue, Empty, Full
+from typing import Callable, Any, Optional, Dict, Set
+from threading import Thread, Event, Lock
+
+import numpy as np
+
+from audiochains.exceptions import AppException
 
 
 def in_thread(target_function: Callable[..., None]) -> Callable[..., None]:
     """
-    This function is used as decorator for concurrent audio processing
+    This function is used as decorator for concurrent audio processing.
+    It starts a new thread on every call, PipelinedRunner should be preferred for long-running processing.
 
     :param target_function: real-time audio recording method
     :return:
@@ -36,3 +42,182 @@ class AudioInThread(Thread):
 
     def is_stopped(self):
         return self._stop_event.is_set()
+
+
+class StreamConsumer(AudioInThread):
+    """
+    This class runs the chain of the stream working in callback mode on a separate thread.
+    Each processed block is passed to on_result function.
+    """
+    def __init__(self, stream, on_result: Optional[Callable[[Any], None]] = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stream = stream
+        self.on_result = on_result
+
+    def run(self):
+        while not self.is_stopped() and self.stream.active:
+            result = self.stream.apply()
+            if result is not None and self.on_result is not None:
+                self.on_result(result)
+
+
+class PipelinedRunner:
+    """
+    This class runs the chain over blocks of the stream in a pipeline: blocks are captured
+    on one thread and processed by a bounded pool of worker threads connected by bounded queues.
+    Results are delivered in the capture order to on_result or to the unbounded results queue.
+    When workers can't keep up, the capture either waits (policy='block') or drops
+    the oldest waiting block (policy='drop_oldest'), dropped blocks are skipped in the output.
+    With several workers the methods are called concurrently, so the chain should not keep
+    state between blocks (streaming filters, StreamingMFCC, etc. need workers=1).
+
+    Example
+    ------
+        runner = PipelinedRunner(stream, workers=2, policy='drop_oldest', on_result=print)
+        runner.start()
+        ...
+        runner.stop()
+        runner.join()
+    """
+    policies = ('block', 'drop_oldest')
+
+    def __init__(self,
+                 stream,
+                 chain_of_methods=None,
+                 workers: int = 2,
+                 max_pending: int = 8,
+                 policy: str = 'block',
+                 on_result: Optional[Callable[[Any], None]] = None,
+                 iterations: Optional[int] = None):
+        if policy not in self.policies:
+            raise AppException.StreamException(f'unknown backpressure policy: {policy}')
+        self.stream = stream
+        self.chain_of_methods = chain_of_methods or stream.chain_of_methods
+        self.policy = policy
+        self.on_result = on_result
+        self.iterations = iterations
+        self.results = Queue()
+        self.error: Optional[BaseException] = None
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self._blocks = Queue(maxsize=max_pending)
+        self._stop_event = Event()
+        self._lock = Lock()
+        self._next_index = 0
+        self._done: Dict[int, Any] = dict()
+        self._skipped: Set[int] = set()
+        self._capture_thread = Thread(target=self._capture, daemon=True)
+        self._workers = [Thread(target=self._work, daemon=True) for _ in range(workers)]
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+        self._capture_thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops capturing, the blocks already captured are still processed and delivered
+        """
+        self._stop_event.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits for the end of processing and raises the first error of the chain if any
+        """
+        self._capture_thread.join(timeout)
+        for worker in self._workers:
+            worker.join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def is_stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._blocks.qsize()
+
+    def metrics(self) -> dict:
+        return {
+            'captured': self.captured,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'results_depth': self.results.qsize(),
+        }
+
+    def _capture(self) -> None:
+        try:
+            while not self.is_stopped() and (self.iterations is None or self.captured < self.iterations):
+                in_data = self.stream.read_block()
+                if in_data is None or not len(in_data):
+                    break
+                # Zero copy and overlapping reads return views over reused buffers
+                if isinstance(in_data, np.ndarray):
+                    in_data = in_data.copy()
+                self._put_block((self.captured, in_data))
+                self.captured += 1
+        except Exception as error:
+            self.error = error
+        finally:
+            for _ in self._workers:
+                self._blocks.put(None)
+
+    def _put_block(self, item) -> None:
+        if self.policy == 'block':
+            self._blocks.put(item)
+        else:
+            while True:
+                try:
+                    self._blocks.put_nowait(item)
+                    break
+                except Full:
+                    try:
+                        index, _ = self._blocks.get_nowait()
+                    except Empty:
+                        continue
+                    self.dropped += 1
+                    self._complete(index, skip=True)
+        self.max_queue_depth = max(self.max_queue_depth, self._blocks.qsize())
+
+    def _work(self) -> None:
+        while True:
+            item = self._blocks.get()
+            if item is None:
+                return
+            index, in_data = item
+            try:
+                result = self.chain_of_methods(in_data)
+            except Exception as error:
+                self.error = self.error or error
+                self._complete(index, skip=True)
+                continue
+            self._complete(index, result)
+
+    def _complete(self, index: int, result: Any = None, skip: bool = False) -> None:
+        """
+        Stores the result and delivers all results which are ready in the capture order
+        """
+        with self._lock:
+            if skip:
+                self._skipped.add(index)
+            else:
+                self._done[index] = result
+            while True:
+                if self._next_index in self._skipped:
+                    self._skipped.remove(self._next_index)
+                elif self._next_index in self._done:
+                    self._deliver(self._done.pop(self._next_index))
+                else:
+                    break
+                self._next_index += 1
+
+    def _deliver(self, result: Any) -> None:
+        self.processed += 1
+        if self.on_result is not None:
+            self.on_result(result)
+        else:
+            self.results.put(result)
@@ -1,5 +1,21 @@
+import os
+import struct
+import time
 import wave
+import zipfile
 from abc import ABC, abstractmethod
+from dataclasses import fields, is_dataclass
+from enum import IntEnum
+from queue import Queue, Empty
+from threading import Thread
+from time import monotonic
+from typing import Optional, Dict, Callable, List, Tuple
+
+import numpy as np
+
+from audiochains.exceptions import AppException
+from audiochains.output_types import VoiceRange, FourierTuple
+from audiochains.readers import WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
 
 
 class WriterInFile(ABC):
@@ -53,3 +69,514 @@ class WriterInWAV(WriterInFile):
 
     def write(self, in_data) -> None:
         self.wav_file.writeframesraw(in_data)
+
+
+class BufferedWriterInWAV(WriterInFile):
+    """
+    This class implement writing bytes-type data in WAV file through preallocated in-memory buffers.
+    The write call only copies the block, full buffers are written to disk by a background thread.
+    If all buffers are waiting for the disk, write blocks until one of them is free (counted in stalls).
+    RIFF header lengths are patched on close and, with fsync_interval, at least every fsync_interval
+    seconds together with os.fsync, so after a crash the file is readable up to the last sync.
+    Samples of sampwidth 4 are float32 unless sample_format='int32' is passed, as in PackFloat32InRaw.
+    RIFF sizes are 32-bit, so the write which would exceed max_data_bytes raises WriterException.
+    """
+    header_size = 44
+    max_data_bytes = 0xFFFFFFFF - 36 - 1
+
+    def __init__(self,
+                 file_name: str,
+                 framerate: int,
+                 sampwidth: int,
+                 channels: int,
+                 buffer_size: int = 1 << 20,
+                 n_buffers: int = 4,
+                 fsync_interval: Optional[float] = None,
+                 sample_format: Optional[str] = None):
+        self.file_name = file_name
+        self.framerate = framerate
+        self.sampwidth = sampwidth
+        self.channels = channels
+        if sample_format is None:
+            sample_format = 'float32' if sampwidth == 4 else None
+        self.format_tag = WAVE_FORMAT_IEEE_FLOAT if sample_format == 'float32' else WAVE_FORMAT_PCM
+        self.buffer_size = buffer_size
+        self.n_buffers = n_buffers
+        self.fsync_interval = fsync_interval
+        self.data_bytes = 0
+        self.stalls = 0
+        self.wav_file = None
+        self.open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self) -> None:
+        self.wav_file = open(self.file_name, 'wb')
+        self.wav_file.write(self._header(0))
+        self.data_bytes = 0
+        self._written_bytes = 0
+        self._error = None
+        self._free_buffers = Queue()
+        for _ in range(self.n_buffers):
+            self._free_buffers.put(np.empty(self.buffer_size, dtype=np.uint8))
+        self._full_buffers = Queue()
+        self._buffer = self._free_buffers.get()
+        self._filled = 0
+        self._submitted_at = monotonic()
+        self._flush_thread = Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
+
+    def write(self, in_data) -> None:
+        if self._error is not None:
+            raise self._error
+        data = np.frombuffer(in_data, dtype=np.uint8)
+        if self.data_bytes + len(data) > self.max_data_bytes:
+            raise AppException.WriterException(
+                f'{self.file_name}: WAV data exceeds {self.max_data_bytes} bytes, '
+                f'use SegmentedWriterInWAV with max_bytes for longer recordings')
+        self.data_bytes += len(data)
+        while len(data):
+            n_bytes = min(len(data), self.buffer_size - self._filled)
+            self._buffer[self._filled:self._filled + n_bytes] = data[:n_bytes]
+            self._filled += n_bytes
+            data = data[n_bytes:]
+            if self._filled == self.buffer_size:
+                self._submit()
+        if self.fsync_interval is not None and self._filled and \
+                monotonic() - self._submitted_at >= self.fsync_interval:
+            self._submit()
+
+    def flush(self) -> None:
+        """
+        Passes the partially filled buffer to the background thread
+        """
+        if self._filled:
+            self._submit()
+
+    def close(self) -> None:
+        if self.wav_file is None:
+            return
+        self.flush()
+        self._full_buffers.put(None)
+        self._flush_thread.join()
+        if self.data_bytes % 2:
+            self.wav_file.write(b'\x00')
+        self._patch_header()
+        self.wav_file.close()
+        self.wav_file = None
+        if self._error is not None:
+            raise self._error
+
+    def _header(self, data_bytes: int) -> bytes:
+        block_align = self.channels * self.sampwidth
+        return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_bytes + data_bytes % 2, b'WAVE',
+                           b'fmt ', 16, self.format_tag, self.channels, self.framerate, self.framerate * block_align,
+                           block_align, self.sampwidth * 8, b'data', data_bytes)
+
+    def _patch_header(self) -> None:
+        position = self.wav_file.tell()
+        self.wav_file.seek(0)
+        self.wav_file.write(self._header(self._written_bytes))
+        self.wav_file.seek(position)
+
+    def _submit(self) -> None:
+        self._full_buffers.put((self._buffer, self._filled))
+        try:
+            self._buffer = self._free_buffers.get_nowait()
+        except Empty:
+            self.stalls += 1
+            self._buffer = self._free_buffers.get()
+        self._filled = 0
+        self._submitted_at = monotonic()
+
+    def _flush_loop(self) -> None:
+        synced_at = monotonic()
+        while True:
+            item = self._full_buffers.get()
+            if item is None:
+                return
+            buffer, filled = item
+            try:
+                if self._error is None:
+                    self.wav_file.write(buffer[:filled])
+                    self._written_bytes += filled
+                    if self.fsync_interval is not None and monotonic() - synced_at >= self.fsync_interval:
+                        self._sync()
+                        synced_at = monotonic()
+            except OSError as error:
+                self._error = error
+            self._free_buffers.put(buffer)
+
+    def _sync(self) -> None:
+        self._patch_header()
+        self.wav_file.flush()
+        os.fsync(self.wav_file.fileno())
+
+
+def feature_columns(in_data) -> Dict[str, np.ndarray]:
+    """
+    Splits the result of the chain into columns: the fields of dataclass results
+    (FourierTuple, PitchTuple) or the single 'value' column for scalars, VoiceRange labels and arrays.
+    Scalar numbers are float64, so a silent first block (DBLog10 gives int 0) doesn't fix an integer column.
+    """
+    if is_dataclass(in_data):
+        return {field.name: np.asarray(getattr(in_data, field.name)) for field in fields(in_data)}
+    if isinstance(in_data, IntEnum):
+        return {'value': np.asarray(in_data, dtype=np.int8)}
+    if isinstance(in_data, (int, float, np.integer, np.floating)) and not isinstance(in_data, (bool, np.bool_)):
+        return {'value': np.asarray(in_data, dtype=np.float64)}
+    return {'value': np.asarray(in_data)}
+
+
+class ChunkedFeatureWriter(WriterInFile):
+    """
+    A common part of feature writers: the results of the chain are stored by columns
+    together with the 'timestamp' column of blocks. Rows are collected in preallocated chunks
+    of chunk_rows and passed to the file at once, so the memory is bounded by one chunk.
+    The timestamp is passed to write or calculated from block_duration, the wall clock time is used otherwise.
+    The fields of axis_fields (the frequency axis of FourierTuple spectra) are the same in every row,
+    they are written once, without the rows dimension.
+    With frames=True the results carry a variable amount of frames along their last axis
+    (StreamingMFCC, StreamingYIN), every frame is a row then, together with the 'block' column of the block index
+    and the timestamp of its block.
+    """
+    extension = ''
+    axis_fields = {FourierTuple: ('frequency',)}
+
+    def __init__(self,
+                 file_name: str,
+                 block_duration: Optional[float] = None,
+                 chunk_rows: int = 1024,
+                 frames: bool = False):
+        if file_name.endswith(self.extension):
+            file_name = file_name[:-len(self.extension)]
+        self.file_name = file_name
+        self.block_duration = block_duration
+        self.chunk_rows = chunk_rows
+        self.frames = frames
+        self.rows = 0
+        self.blocks = 0
+        self._chunks: Dict[str, np.ndarray] = dict()
+        self._axes: Dict[str, np.ndarray] = dict()
+        self._filled = 0
+        self.open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self) -> None:
+        self.rows = 0
+        self.blocks = 0
+        self._chunks = dict()
+        self._axes = dict()
+        self._filled = 0
+
+    def close(self) -> None:
+        if self._filled:
+            self._write_chunks()
+
+    def write(self, in_data, timestamp: Optional[float] = None) -> None:
+        if timestamp is None:
+            timestamp = self.blocks * self.block_duration if self.block_duration is not None else time.time()
+        columns = feature_columns(in_data)
+        columns['timestamp'] = np.asarray(timestamp, dtype=np.float64)
+        if self.frames:
+            columns['block'] = np.asarray(self.blocks, dtype=np.int64)
+        axes = {name: columns.pop(name) for name in self.axis_fields.get(type(in_data), ())}
+        rows, n_rows = self._to_rows(columns)
+
+        if not self._chunks:
+            for name, axis in axes.items():
+                self._axes[name] = axis.copy()
+                self._write_axis(name, axis)
+            for name, value in rows.items():
+                self._chunks[name] = np.empty((self.chunk_rows,) + value.shape[1:], dtype=value.dtype)
+                self._open_column(name, value)
+        if rows.keys() != self._chunks.keys() or axes.keys() != self._axes.keys():
+            raise AppException.WriterException(
+                f'columns {list(rows) + list(axes)} differ from {list(self._chunks) + list(self._axes)}')
+
+        for name, axis in self._axes.items():
+            if not np.array_equal(axes[name], axis):
+                raise AppException.WriterException(f'{name} differs from the {name} axis of the first row')
+        for name, chunk in self._chunks.items():
+            if rows[name].shape[1:] != chunk.shape[1:]:
+                raise AppException.WriterException(
+                    f'{name} of shape {rows[name].shape[1:]} does not fit the rows of shape {chunk.shape[1:]}')
+            if not np.can_cast(rows[name].dtype, chunk.dtype, 'same_kind'):
+                raise AppException.WriterException(f'{name} of type {rows[name].dtype} does not fit {chunk.dtype}')
+
+        written = 0
+        while written < n_rows:
+            n_copied = min(n_rows - written, self.chunk_rows - self._filled)
+            for name, chunk in self._chunks.items():
+                chunk[self._filled:self._filled + n_copied] = rows[name][written:written + n_copied]
+            self._filled += n_copied
+            written += n_copied
+            if self._filled == self.chunk_rows:
+                self._write_chunks()
+        self.rows += n_rows
+        self.blocks += 1
+
+    def _to_rows(self, columns: Dict[str, np.ndarray]) -> Tuple[Dict[str, np.ndarray], int]:
+        """
+        Turns the columns of the block into arrays of rows: a single row, or the frames along the last axis
+        with scalar columns repeated for every frame
+        """
+        if not self.frames:
+            return {name: value[np.newaxis] for name, value in columns.items()}, 1
+        n_frames = {value.shape[-1] for value in columns.values() if value.ndim}
+        if len(n_frames) != 1:
+            raise AppException.WriterException(f'columns {list(columns)} differ in the amount of frames')
+        n_frames = n_frames.pop()
+        rows = {
+            name: np.moveaxis(value, -1, 0) if value.ndim else np.broadcast_to(value, (n_frames,))
+            for name, value in columns.items()
+        }
+        return rows, n_frames
+
+    def _write_chunks(self) -> None:
+        for name, chunk in self._chunks.items():
+            self._write_column(name, chunk[:self._filled])
+        self._filled = 0
+
+    @abstractmethod
+    def _open_column(self, name: str, value: np.ndarray) -> None:
+        ...
+
+    @abstractmethod
+    def _write_column(self, name: str, rows: np.ndarray) -> None:
+        ...
+
+    @abstractmethod
+    def _write_axis(self, name: str, axis: np.ndarray) -> None:
+        ...
+
+
+class WriterInNPY(ChunkedFeatureWriter):
+    """
+    This class implement writing chain results in .npy files, one per column named
+    '<file_name>.<column>.npy'. Chunks are appended to the files and the shape in the fixed-size
+    header is patched on close, so the columns can be opened with np.load(mmap_mode='r').
+
+    Example
+    ------
+        with WriterInNPY('features', block_duration=stream.blocksize / stream.samplerate) as writer:
+            for _ in range(stream.get_iterations(seconds=10)):
+                writer.write(stream.apply())
+        columns = read_features('features')
+    """
+    extension = '.npy'
+
+    def open(self) -> None:
+        super().open()
+        self._files = dict()
+
+    def close(self) -> None:
+        super().close()
+        for name, column_file in self._files.items():
+            column_file.seek(0)
+            column_file.write(self._header(self._chunks[name], self.rows))
+            column_file.close()
+        self._files = dict()
+
+    def _open_column(self, name: str, value: np.ndarray) -> None:
+        column_file = open(f'{self.file_name}.{name}{self.extension}', 'wb')
+        column_file.write(self._header(self._chunks[name], 0))
+        self._files[name] = column_file
+
+    def _write_column(self, name: str, rows: np.ndarray) -> None:
+        self._files[name].write(rows.tobytes())
+
+    def _write_axis(self, name: str, axis: np.ndarray) -> None:
+        np.save(f'{self.file_name}.{name}{self.extension}', axis)
+
+    @staticmethod
+    def _header(chunk: np.ndarray, rows: int) -> bytes:
+        """
+        The npy 1.0 header padded to the size fitting any amount of rows
+        """
+        def describe(n_rows: int) -> str:
+            return repr({
+                'descr': np.lib.format.dtype_to_descr(chunk.dtype),
+                'fortran_order': False,
+                'shape': (n_rows,) + chunk.shape[1:],
+            })
+
+        magic = b'\x93NUMPY\x01\x00'
+        size = -(-(len(magic) + 2 + len(describe(2 ** 63)) + 1) // 64) * 64
+        description = describe(rows).ljust(size - len(magic) - 3) + '\n'
+        return magic + struct.pack('<H', len(description)) + description.encode('latin1')
+
+
+class WriterInNPZ(ChunkedFeatureWriter):
+    """
+    This class implement writing chain results in compressed .npz file.
+    Every chunk of every column is a separate archive member named '<column>.<chunk index>',
+    read_features concatenates them back. Axis columns are single members named '<column>'.
+    """
+    extension = '.npz'
+
+    def open(self) -> None:
+        super().open()
+        self._archive = zipfile.ZipFile(self.file_name + self.extension, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._chunk_indices = dict()
+
+    def close(self) -> None:
+        super().close()
+        self._archive.close()
+
+    def _open_column(self, name: str, value: np.ndarray) -> None:
+        self._chunk_indices[name] = 0
+
+    def _write_column(self, name: str, rows: np.ndarray) -> None:
+        member_name = f'{name}.{self._chunk_indices[name]:06d}.npy'
+        with self._archive.open(member_name, 'w', force_zip64=True) as member:
+            np.lib.format.write_array(member, rows)
+        self._chunk_indices[name] += 1
+
+    def _write_axis(self, name: str, axis: np.ndarray) -> None:
+        with self._archive.open(f'{name}.npy', 'w', force_zip64=True) as member:
+            np.lib.format.write_array(member, axis)
+
+
+class SegmentedWriterInWAV(WriterInFile):
+    """
+    This class implement writing the stream in a sequence of WAV files '<file_name>_<index>.wav'.
+    A new file is started when the current one reaches max_seconds or max_bytes.
+    If the gate is passed (e.g. ChainOfMethods(RMSFromBytes(), DBLog10(), SoundPressureThreshold(...))),
+    only the blocks where it returns at least gate_level are written together with pre_roll_blocks
+    before and post_roll_blocks after them, and each such span starts a new file.
+    Written blocks are passed to the writer as is, only pre-roll blocks are copied once into
+    the preallocated ring, so views over reused buffers (zero copy reads) are accepted.
+    segments stores (file name, first frame) of each file.
+    """
+
+    def __init__(self,
+                 file_name: str,
+                 framerate: int,
+                 sampwidth: int,
+                 channels: int,
+                 max_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None,
+                 gate: Optional[Callable] = None,
+                 gate_level: VoiceRange = VoiceRange.WHISPER,
+                 pre_roll_blocks: int = 0,
+                 post_roll_blocks: int = 0,
+                 writer_class=WriterInWAV):
+        if file_name.endswith('.wav'):
+            file_name = file_name[:-len('.wav')]
+        self.file_name = file_name
+        self.framerate = framerate
+        self.sampwidth = sampwidth
+        self.channels = channels
+        self.max_bytes = max_bytes
+        if max_seconds is not None:
+            seconds_bytes = int(max_seconds * framerate) * sampwidth * channels
+            self.max_bytes = seconds_bytes if max_bytes is None else min(max_bytes, seconds_bytes)
+        self.gate = gate
+        self.gate_level = gate_level
+        self.pre_roll_blocks = pre_roll_blocks
+        self.post_roll_blocks = post_roll_blocks
+        self.writer_class = writer_class
+        self.segments: List[Tuple[str, int]] = list()
+        self.writer = None
+        self.open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self) -> None:
+        self.segments = list()
+        self.position = 0
+        self._segment_bytes = 0
+        self._post_roll_left = 0
+        self._pre_roll = None
+        self._pre_roll_lengths = np.zeros(self.pre_roll_blocks, dtype=np.int64)
+        self._pre_roll_start = 0
+        self._pre_roll_count = 0
+
+    def close(self) -> None:
+        self._close_segment()
+
+    def write(self, in_data, voice_range: Optional[VoiceRange] = None) -> None:
+        """
+        Writes or holds the block. The voice_range already calculated for the block can be passed instead of the gate,
+        without both of them every block is written.
+        """
+        frame_bytes = self.sampwidth * self.channels
+        n_bytes = memoryview(in_data).nbytes
+        if voice_range is None and self.gate is not None:
+            voice_range = self.gate(in_data)
+        active = voice_range is None or np.max(voice_range) >= self.gate_level
+
+        if active:
+            if self.writer is None and self._pre_roll_count:
+                self._write_pre_roll()
+            self._write_block(in_data)
+            self._post_roll_left = self.post_roll_blocks
+        elif self.writer is not None and self._post_roll_left:
+            self._write_block(in_data)
+            self._post_roll_left -= 1
+        else:
+            self._close_segment()
+            self._hold_block(in_data)
+        self.position += n_bytes // frame_bytes
+
+    def _open_segment(self, first_frame: int) -> None:
+        segment_name = f'{self.file_name}_{len(self.segments):04d}.wav'
+        self.writer = self.writer_class(segment_name, self.framerate, self.sampwidth, self.channels)
+        self.segments.append((segment_name, first_frame))
+        self._segment_bytes = 0
+
+    def _close_segment(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _write_block(self, in_data, frame: Optional[int] = None) -> None:
+        n_bytes = memoryview(in_data).nbytes
+        if self.writer is not None and self.max_bytes is not None and \
+                self._segment_bytes + n_bytes > self.max_bytes and self._segment_bytes:
+            self._close_segment()
+        if self.writer is None:
+            self._open_segment(self.position if frame is None else frame)
+        self.writer.write(in_data)
+        self._segment_bytes += n_bytes
+
+    def _hold_block(self, in_data) -> None:
+        """
+        Copies the block into the pre-roll ring replacing the oldest one
+        """
+        if not self.pre_roll_blocks:
+            return
+        data = np.frombuffer(in_data, dtype=np.uint8)
+        if self._pre_roll is None or self._pre_roll.shape[1] < len(data):
+            self._pre_roll = np.empty((self.pre_roll_blocks, len(data)), dtype=np.uint8)
+            self._pre_roll_count = 0
+        index = (self._pre_roll_start + self._pre_roll_count) % self.pre_roll_blocks
+        if self._pre_roll_count == self.pre_roll_blocks:
+            self._pre_roll_start = (self._pre_roll_start + 1) % self.pre_roll_blocks
+        else:
+            self._pre_roll_count += 1
+        self._pre_roll[index, :len(data)] = data
+        self._pre_roll_lengths[index] = len(data)
+
+    def _write_pre_roll(self) -> None:
+        frame_bytes = self.sampwidth * self.channels
+        indices = [(self._pre_roll_start + i) % self.pre_roll_blocks for i in range(self._pre_roll_count)]
+        frame = self.position - int(self._pre_roll_lengths[indices].sum()) // frame_bytes
+        for index in indices:
+            self._write_block(self._pre_roll[index, :self._pre_roll_lengths[index]], frame)
+            frame += int(self._pre_roll_lengths[index]) // frame_bytes
+        self._pre_roll_count = 0